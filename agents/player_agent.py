@@ -1,55 +1,68 @@
-from mesa import Agent
-from utils import find_best_path, compute_token_needs
+from model.core import Agent
+from model.agent_store import StoredState
+from utils import find_best_path, needs_from_counts
+from model.board import PathCounts
+from model.market import GreedyPolicy
+from model.tracing import PathChosen, Blocked, GoalReached
+
+class PlayerAgent(StoredState, Agent):
+    allocation_policy = GreedyPolicy()
 
-class PlayerAgent(Agent):
     def __init__(self, unique_id, intial_tokens, model):
         super().__init__(model)
-        self.tokens = intial_tokens
-        self.blocked_steps = 0
-        self.goal_reached = False 
+        # Tokens, blocked steps and goal flag live in the model's agent store
+        self.attach_store(model.agent_store, intial_tokens)
         self.needs = {}
         self.agent_id = unique_id
         
     def step(self):
-        print(f"[*] Agent {self.agent_id} is thinking -------------------------------------------------------")
+        self.apply_plan(self.plan())
 
+    def plan(self):
+        """Path to follow this step, or None when done; reads shared state only"""
         if self.goal_reached or self.blocked_steps >= 3:
+            return None
+        return find_best_path(self.pos, self.model.goal_pos, self.model)
+
+    def apply_plan(self, path):
+        if path is None:
             return
 
-        path = find_best_path(self.pos, self.model.goal_pos, self.model)
-        self.needs = compute_token_needs(path, self.tokens, self.model)
+        self.path_counts = PathCounts(self.model.tile_colors, path)
+        self.needs = needs_from_counts(self.path_counts.remaining(), self.tokens)
         self.model.broadcast_needs(self.unique_id, self.needs)
         self.path_to_goal = path        
-        print(f"[*] Agent {self.agent_id} infos : \nPath :  {path}\nNeeds : {self.needs}")    
+        if self.model.tracer.debug:
+            self.model.tracer.emit(PathChosen(self.model.schedule.steps, self.agent_id, path))
     
     def advance(self):
-        self.trade()
-        
+        # Offers were already matched and handed over when the model cleared the market
         if self.goal_reached:
             return
 
-        offers = self.model.offers_pool.get(self.unique_id, {})
-        for color, amount in offers.items():
-            self.tokens[color] = self.tokens.get(color, 0) + amount
-
         next_tile = self.path_to_goal[1]  
-        tile_color = self.model.grid[next_tile[1]][next_tile[0]]  
+        tile_color = self.model.tile_colors[next_tile]  
 
     
         if self.tokens.get(tile_color, 0) > 0:
-            self.tokens[tile_color] -= 1
-            self.pos = next_tile
-            self.model.grid.place_agent(self, self.pos)
+            self.model.move_agent(self, next_tile)
             self.path_to_goal = self.path_to_goal[1:]  
+            self.path_counts.advance()
             self.blocked_steps = 0  
         else:
             self.blocked_steps += 1  
+            if self.model.metrics.enabled:
+                self.model.metrics.count("blocked_moves")
+            if self.model.tracer.info:
+                self.model.tracer.emit(Blocked(self.model.schedule.steps, self.agent_id, self.pos, tile_color))
 
         if self.pos == self.model.goal_pos:
             self.goal_reached = True
+            if self.model.tracer.info:
+                self.model.tracer.emit(GoalReached(self.model.schedule.steps, self.agent_id, self.pos))
             
-    def trade(self):
-        print(f"[*] Agent {self.agent_id} is trading --------------------------------------------------------")
+    def offerable_tokens(self):
+        """Tokens we hold beyond what we still need, offered to the market"""
         required_tokens = self.needs
 
         excess_tokens = {}
@@ -57,19 +70,4 @@ class PlayerAgent(Agent):
             required = required_tokens.get(color, 0)
             if qty > required:
                 excess_tokens[color] = qty - required
-
-        for other_id, other_needs in self.model.needs_pool.items():
-            if other_id == self.unique_id:
-                continue 
-
-            for color, needed_qty in other_needs.items():
-                offer_amount = min(needed_qty, excess_tokens.get(color, 0))
-                if offer_amount > 0:
-                    if other_id not in self.model.offers_pool:
-                        self.model.offers_pool[other_id] = {}
-                    self.model.offers_pool[other_id][color] = self.model.offers_pool[other_id].get(color, 0) + offer_amount
-
-                    excess_tokens[color] -= offer_amount
-                    self.tokens[color] -= offer_amount
-
-        print(f"[*] Offers pool after Agent {self.agent_id} traded   : \n{self.model.offers_pool}")
+        return excess_tokens
@@ -1,61 +1,169 @@
-from mesa import Agent
-from utils import find_best_path, compute_token_needs
-import networkx as nx
-import random
-from collections import defaultdict
+from model.core import Agent
+from model.agent_store import StoredState
+from utils import find_affordable_path, compute_token_needs, needs_from_counts, to_vector, to_dict, inventory_key
+from model.board import PathCounts
+from model.tracing import PathChosen, Blocked, GoalReached
+from pathfinding.k_shortest import shortest_simple_paths
+from model.market import StrategicPolicy
+from itertools import islice
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+
+
+def path_tile_cost(tile_colors, tokens, pos):
+    """Lower bound of what entering a tile adds to a path's score"""
+    if tokens.get(tile_colors[pos], 0) > 0:
+        return 2
+    return 2 + 5  # Every tile of a color we hold no token of is a missing token
+
+
+def score_lower_bound(board, start_pos, tokens):
+    """Lower bound of the score of every path from start_pos, from the board's color transforms"""
+    index = board.board_index()
+    gx, gy = board.goal_pos
+    steps = abs(start_pos[0] - gx) + abs(start_pos[1] - gy)
+    held = [color for color in COLORS if tokens.get(color, 0) > 0]
+    # Every tile of a color we hold no token of is a missing token, and so is
+    # every tile of a color beyond our tokens of it or beyond all our tokens
+    minimum = board.color_requirement_field(board.goal_pos).at(start_pos)
+    missing = max(int(index.fewest(set(COLORS) - set(held))[start_pos]),
+                  sum(max(0, need - tokens.get(color, 0)) for color, need in zip(COLORS, minimum)),
+                  steps - sum(tokens.values()))
+    if missing == 0 and index.distance(held)[start_pos] != steps:
+        # Avoiding them takes a detour, which is at least two steps longer
+        return 2 + 2 * (steps + 2)
+    return 2 + 2 * steps + 5 * missing
+
+
+def candidate_paths_from(board, start_pos, tokens):
+    """Lazily yield distinct paths to the goal, k-shortest by tile cost after the affordable one"""
+    affordable_path, _ = find_affordable_path(start_pos, board.goal_pos, tokens, board)
+    yield affordable_path
+    # path_tile_cost and a lower bound of the cost still to come, as lookups in the board index
+    index = board.board_index()
+    missing = [color for color in COLORS if tokens.get(color, 0) <= 0]
+    costs = (2 + 5 * index.mask(missing)).tolist()
+    bounds = (2 * index.distance(COLORS) + 5 * index.fewest(missing)).tolist()
+    for path in shortest_simple_paths(board.board_graph, start_pos, board.goal_pos,
+                                      node_cost=lambda pos: costs[pos[0]][pos[1]],
+                                      heuristic=lambda pos: bounds[pos[0]][pos[1]]):
+        if path != affordable_path:
+            yield path
+
+
+def plan_optimal_path(board, start_pos, tokens, max_paths=5):
+    """
+    Select the most efficient path based on token requirements.
+
+    Only reads the board (the model, or a worker's read-only copy of it) and
+    the given tokens, so it can run in another thread or process. Returns the
+    best path and every candidate that was scored. Results are memoized in
+    the board's path cache per (position, inventory, goal, board version).
+    """
+    key = ("optimal", start_pos, inventory_key(tokens), board.goal_pos, board.tile_colors.version, max_paths)
+    best_path, alternative_paths = board.path_cache.get_or_compute(
+        key, lambda: _score_candidates(board, start_pos, tokens, max_paths))
+    return best_path, list(alternative_paths)
+
+
+def _score_candidates(board, start_pos, tokens, max_paths):
+    best_path = None
+    best_score = float('inf')
+    alternative_paths = []
+    floor = score_lower_bound(board, start_pos, tokens)
+
+    for path in islice(candidate_paths_from(board, start_pos, tokens), max_paths):
+        # Later candidates never cost less under the tile cost, so stop as soon as
+        # even this lower bound of the score can't beat the best path so far
+        lower_bound = 2 + sum(path_tile_cost(board.tile_colors, tokens, pos) for pos in path[1:])
+        if lower_bound >= best_score:
+            break
+        alternative_paths.append(path)
+
+        # Calculate token needs for this path
+        path_needs = compute_token_needs(path, tokens, board)
+
+        # Calculate a score based on path length and token deficiency
+        path_score = len(path) * 2  # Base score on length
+
+        # Add penalty for each missing token
+        for color, amount in path_needs.items():
+            path_score += amount * 5  # Missing tokens are expensive
+
+        # Check if this path has a better score
+        if path_score < best_score:
+            best_score = path_score
+            best_path = path
+        if best_score <= floor:
+            # No path at all scores lower, so the remaining candidates need not be generated
+            break
+
+    return best_path, alternative_paths
+
+
+class StrategicNegotiatorAgent(StoredState, Agent):
+    allocation_policy = StrategicPolicy()
 
-class StrategicNegotiatorAgent(Agent):
     def __init__(self, unique_id, initial_tokens, model):
-        super().__init__(unique_id, model)
-        self.tokens = initial_tokens.copy()
-        self.blocked_steps = 0
-        self.goal_reached = False
+        super().__init__(model)
+        # Tokens, blocked steps and goal flag live in the model's agent store
+        self.attach_store(model.agent_store, initial_tokens)
         self.needs = {}
         self.agent_id = unique_id
         self.path_to_goal = []
+        self.path_counts = PathCounts(model.tile_colors, [])
         self.trade_history = {}  # Keep track of past trades
         self.alternative_paths = []
         self.exploration_chance = 0.2  # Chance to try alternative paths
     
     def step(self):
-        print(f"[*] Strategic Negotiator Agent {self.agent_id} is thinking ----------------------------")
-        
+        self.apply_plan(self.plan())
+
+    def plan(self):
+        """Best path and the scored candidates, or None when done; reads shared state only"""
+        if self.goal_reached or self.blocked_steps >= 3:
+            return None
+        # Evaluate candidate paths one at a time and select the best based on token availability
+        return plan_optimal_path(self.model, self.pos, self.tokens)
+
+    def plan_task(self):
+        """Picklable form of plan() for a planning worker process"""
         if self.goal_reached or self.blocked_steps >= 3:
+            return None
+        return plan_optimal_path, (self.pos, dict(self.tokens))
+
+    def apply_plan(self, plan):
+        if plan is None:
             return
-        
-        # Find multiple potential paths
-        self.alternative_paths = self.find_multiple_paths()
-        
-        # Evaluate and select best path based on token availability
-        self.path_to_goal = self.select_optimal_path()
+
+        self.path_to_goal, self.alternative_paths = plan
+        if self.model.metrics.enabled:
+            self.model.metrics.count("path_searches", len(self.alternative_paths))
+        self.path_counts = PathCounts(self.model.tile_colors, self.path_to_goal)
         
         # Calculate token needs for chosen path
-        self.needs = compute_token_needs(self.path_to_goal, self.tokens, self.model)
+        self.needs = needs_from_counts(self.path_counts.remaining(), self.tokens)
         
         # Broadcast needs to other agents
         self.model.broadcast_needs(self.unique_id, self.needs)
         
-        print(f"[*] Agent {self.agent_id} selected path: {self.path_to_goal}")
-        print(f"[*] Agent {self.agent_id} needs: {self.needs}")
+        if self.model.tracer.debug:
+            self.model.tracer.emit(PathChosen(self.model.schedule.steps, self.agent_id, self.path_to_goal))
     
     def advance(self):
-        self.strategic_trade()
-        
+        # Offers were already matched and handed over when the model cleared the market
         if self.goal_reached:
             return
         
-        # Check if we can use tokens from offers
-        offers = self.model.offers_pool.get(self.unique_id, {})
-        for color, amount in offers.items():
-            self.tokens[color] = self.tokens.get(color, 0) + amount
-        
         # If current path is blocked, consider alternative paths
-        if self.blocked_steps > 0 and random.random() < self.exploration_chance:
+        if self.blocked_steps > 0 and self.model.random.random() < self.exploration_chance:
             new_path = self.select_optimal_path()
             if new_path != self.path_to_goal:
-                print(f"[*] Agent {self.agent_id} is switching paths due to blockage")
                 self.path_to_goal = new_path
-                self.needs = compute_token_needs(self.path_to_goal, self.tokens, self.model)
+                if self.model.tracer.debug:
+                    self.model.tracer.emit(PathChosen(self.model.schedule.steps, self.agent_id, new_path))
+                self.path_counts = PathCounts(self.model.tile_colors, new_path)
+                self.needs = needs_from_counts(self.path_counts.remaining(), self.tokens)
                 self.model.broadcast_needs(self.unique_id, self.needs)
         
         # Try to move along path
@@ -64,160 +172,45 @@ class StrategicNegotiatorAgent(Agent):
             tile_color = self.model.tile_colors[next_pos]
             
             if self.tokens.get(tile_color, 0) > 0:
-                self.tokens[tile_color] -= 1
-                self.model.grid.move_agent(self, next_pos)
+                self.model.move_agent(self, next_pos)
                 self.path_to_goal = self.path_to_goal[1:]
+                self.path_counts.advance()
                 self.blocked_steps = 0
             else:
                 self.blocked_steps += 1
-                print(f"[*] Agent {self.agent_id} is blocked! Needs {tile_color} token.")
+                if self.model.metrics.enabled:
+                    self.model.metrics.count("blocked_moves")
+                if self.model.tracer.info:
+                    self.model.tracer.emit(Blocked(self.model.schedule.steps, self.agent_id, self.pos, tile_color))
         
         if self.pos == self.model.goal_pos:
             self.goal_reached = True
-            print(f"[*] Agent {self.agent_id} reached the goal!")
+            if self.model.tracer.info:
+                self.model.tracer.emit(GoalReached(self.model.schedule.steps, self.agent_id, self.pos))
+    
+    def tile_cost(self, pos):
+        """Lower bound of what entering a tile adds to a path's score"""
+        return path_tile_cost(self.model.tile_colors, self.tokens, pos)
+    
+    def candidate_paths(self):
+        """Lazily yield distinct paths to the goal, k-shortest by tile_cost after the affordable one"""
+        return candidate_paths_from(self.model, self.pos, self.tokens)
     
     def find_multiple_paths(self, max_paths=5):
         """Find multiple potential paths to the goal"""
-        G = nx.grid_2d_graph(self.model.grid_width, self.model.grid_height)
-        
-        try:
-            # Get shortest path
-            paths = [nx.shortest_path(G, source=self.pos, target=self.model.goal_pos)]
-            
-            # Try to find alternative paths
-            for _ in range(max_paths - 1):
-                # Modify graph to discourage using nodes from previous paths
-                temp_G = G.copy()
-                for path in paths:
-                    for node in path[1:-1]:  # Don't modify start and end nodes
-                        if temp_G.has_node(node):
-                            for neighbor in temp_G.neighbors(node):
-                                if temp_G.has_edge(node, neighbor):
-                                    # Increase the cost of this edge
-                                    temp_G[node][neighbor]['weight'] = 10
-                
-                # Find new shortest path with modified weights
-                try:
-                    new_path = nx.shortest_path(temp_G, source=self.pos, 
-                                               target=self.model.goal_pos, weight='weight')
-                    if new_path not in paths:
-                        paths.append(new_path)
-                except:
-                    break
-                    
-            return paths
-        except nx.NetworkXNoPath:
-            return [find_best_path(self.pos, self.model.goal_pos, self.model)]
+        return list(islice(self.candidate_paths(), max_paths))
     
-    def select_optimal_path(self):
+    def select_optimal_path(self, max_paths=5):
         """Select the most efficient path based on token requirements"""
-        if not self.alternative_paths:
-            return find_best_path(self.pos, self.model.goal_pos, self.model)
-        
-        best_path = None
-        best_score = float('inf')
-        
-        for path in self.alternative_paths:
-            # Calculate token needs for this path
-            path_needs = compute_token_needs(path, self.tokens, self.model)
-            
-            # Calculate a score based on path length and token deficiency
-            path_score = len(path) * 2  # Base score on length
-            
-            # Add penalty for each missing token
-            for color, amount in path_needs.items():
-                path_score += amount * 5  # Missing tokens are expensive
-            
-            # Check if this path has a better score
-            if path_score < best_score:
-                best_score = path_score
-                best_path = path
-        
-        return best_path or self.alternative_paths[0]
+        best_path, self.alternative_paths = plan_optimal_path(self.model, self.pos, self.tokens, max_paths)
+        if self.model.metrics.enabled:
+            self.model.metrics.count("path_searches", len(self.alternative_paths))
+        return best_path
     
-    def strategic_trade(self):
-        print(f"[*] Agent {self.agent_id} is strategically trading -----------------------------------")
-        
-        # Assess what we have in excess vs what we need
-        excess_tokens = {}
-        for color, qty in self.tokens.items():
-            required = self.calculate_total_need(color)
-            if qty > required:
-                excess_tokens[color] = qty - required
-        
-        # Analyze other agents' needs and our potential gains
-        potential_trades = {}
-        for other_id, other_needs in self.model.needs_pool.items():
-            if other_id == self.unique_id:
-                continue
-            
-            # Calculate trade value
-            can_give = {}
-            for color, needed_qty in other_needs.items():
-                if color in excess_tokens and excess_tokens[color] > 0:
-                    can_give[color] = min(needed_qty, excess_tokens[color])
-            
-            # Skip if we can't give anything
-            if not can_give:
-                continue
-            
-            # Get other agent's excess that matches our needs
-            other_agent = self.model.get_agent_by_id(other_id)
-            can_receive = {}
-            
-            # Using our knowledge of others' tokens to estimate what they might give
-            if other_agent:
-                other_tokens = getattr(other_agent, 'tokens', {})
-                for color, needed in self.needs.items():
-                    if color in other_tokens and other_tokens.get(color, 0) > self.calculate_other_need(other_agent, color):
-                        can_receive[color] = min(needed, other_tokens.get(color, 0) - self.calculate_other_need(other_agent, color))
-            
-            # Calculate trade score (what we get vs what we give)
-            trade_score = sum(can_receive.values()) - 0.7 * sum(can_give.values())
-            
-            # Adjust based on trade history
-            if other_id in self.trade_history:
-                trade_score += self.trade_history[other_id] * 0.3
-            
-            # Save potential trade
-            potential_trades[other_id] = {
-                'score': trade_score,
-                'give': can_give
-            }
-        
-        # Execute trades in order of score
-        sorted_trades = sorted(potential_trades.items(), key=lambda x: x[1]['score'], reverse=True)
-        for other_id, trade_info in sorted_trades:
-            give_tokens = trade_info['give']
-            
-            # Make the offer
-            for color, amount in give_tokens.items():
-                if amount > 0 and excess_tokens.get(color, 0) >= amount:
-                    # Add to offers pool
-                    if other_id not in self.model.offers_pool:
-                        self.model.offers_pool[other_id] = {}
-                    
-                    self.model.offers_pool[other_id][color] = self.model.offers_pool[other_id].get(color, 0) + amount
-                    self.tokens[color] -= amount
-                    excess_tokens[color] -= amount
-                    
-                    # Record trade in history
-                    if other_id not in self.trade_history:
-                        self.trade_history[other_id] = 0
-                    self.trade_history[other_id] += 0.5  # Positive adjustment for making an offer
-        
-        print(f"[*] Offers pool after Agent {self.agent_id} traded: {self.model.offers_pool}")
+    def offerable_tokens(self):
+        """Tokens beyond what our whole path needs, offered to the market"""
+        return to_dict(np.maximum(to_vector(self.tokens) - self.path_counts.remaining(), 0))
     
     def calculate_total_need(self, color):
         """Calculate total tokens needed for entire path"""
-        count = 0
-        for pos in self.path_to_goal:
-            if self.model.tile_colors[pos] == color:
-                count += 1
-        return count
-    
-    def calculate_other_need(self, other_agent, color):
-        """Estimate how many tokens another agent needs"""
-        if hasattr(other_agent, 'path_to_goal'):
-            return sum(1 for pos in other_agent.path_to_goal if self.model.tile_colors[pos] == color)
-        return 0
\ No newline at end of file
+        return int(self.path_counts.remaining()[COLOR_INDEX[color]])
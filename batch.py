@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from model.game_model import ColoredTrailsModel
+from model.corpus import BoardCorpus
+from model.scenario import AGENT_CLASSES
+from model.batch_engine import PlayerBatch
+
+# Corpora opened by this process, mapped once and shared by all its games
+_corpora = {}
+
+
+def game_seeds(base_seed, games):
+    # One independent stream per game, derived from the base seed alone so the
+    # results don't depend on how games are spread over workers
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(base_seed).spawn(games)]
+
+
+def run_game(seed, max_steps=100):
+    """Play one game to the end and return its outcome"""
+    return play(ColoredTrailsModel(seed=seed), seed, max_steps)
+
+
+def run_corpus_game(path, index, agent_name, max_steps=100):
+    """Play the corpus record at index with every agent of the named class"""
+    corpus = _corpora.get(path)
+    if corpus is None:
+        corpus = _corpora[path] = BoardCorpus(path)
+    record = corpus.record(index, AGENT_CLASSES[agent_name])
+    result = play(ColoredTrailsModel(seed=record.seed, scenario=record), record.seed, max_steps)
+    result["record"] = index
+    return result
+
+
+def play(model, seed, max_steps):
+    model.running = True
+    steps = 0
+    while model.running and steps < max_steps:
+        model.step()
+        steps += 1
+
+    return {
+        "seed": seed,
+        "steps": steps,
+        # Agents by their agents_infos key, as PlayerBatch.outcomes() numbers them
+        "reached_goal": [a.agent_id for a in model.schedule.agents if a.goal_reached],
+        "deadlocked": model.deadlocked,
+        "tokens_spent": model.tokens_spent,
+        "trades_made": model.market.trades_made,
+    }
+
+
+def run_batch(games, seed=0, workers=None, max_steps=100):
+    """Run independent games over a process pool, results in game order"""
+    seeds = game_seeds(seed, games)
+    chunksize = max(1, games // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_game, seeds, [max_steps] * games, chunksize=chunksize))
+    for game, result in enumerate(results):
+        result["game"] = game
+    return results
+
+
+def run_corpus_batch(path, agent_name, games=None, workers=None, max_steps=100):
+    """Replay the first `games` corpus records (all by default), results in record order"""
+    games = len(BoardCorpus(path)) if games is None else games
+    chunksize = max(1, games // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_corpus_game, [path] * games, range(games), [agent_name] * games,
+                                    [max_steps] * games, chunksize=chunksize))
+    for game, result in enumerate(results):
+        result["game"] = game
+    return results
+
+
+def run_vectorized(games, seed=0, max_steps=100):
+    """The same games as run_batch, all played at once by the array engine (PlayerAgents only)"""
+    seeds = game_seeds(seed, games)
+    results = PlayerBatch.from_seeds(seeds).run(max_steps).outcomes()
+    for game, (game_seed, result) in enumerate(zip(seeds, results)):
+        result["seed"] = game_seed
+        result["game"] = game
+    return results
+
+
+def summarize(results):
+    games = len(results)
+    return {
+        "games": games,
+        "goal_rate": sum(1 for r in results if r["reached_goal"]) / games if games else 0.0,
+        "deadlock_rate": sum(1 for r in results if r["deadlocked"]) / games if games else 0.0,
+        "mean_steps": sum(r["steps"] for r in results) / games if games else 0.0,
+        "mean_tokens_spent": sum(r["tokens_spent"] for r in results) / games if games else 0.0,
+        "mean_trades_made": sum(r["trades_made"] for r in results) / games if games else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many independent Colored Trails games in parallel")
+    parser.add_argument("--games", type=int, default=None, help="default 1000, or the whole corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=100)
+    parser.add_argument("--output", help="write one JSON line per game to this file")
+    parser.add_argument("--corpus", help="replay the boards of this corpus instead of random games")
+    parser.add_argument("--agent-class", choices=sorted(AGENT_CLASSES), default="player",
+                        help="strategy of every agent when replaying a corpus")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="play the default PlayerAgent games with the array engine")
+    args = parser.parse_args()
+
+    if args.vectorized:
+        results = run_vectorized(args.games or 1000, seed=args.seed, max_steps=args.max_steps)
+    elif args.corpus:
+        results = run_corpus_batch(args.corpus, args.agent_class, games=args.games, workers=args.workers,
+                                   max_steps=args.max_steps)
+    else:
+        results = run_batch(args.games or 1000, seed=args.seed, workers=args.workers, max_steps=args.max_steps)
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    print(json.dumps(summarize(results), indent=2))
@@ -0,0 +1,252 @@
+"""
+Benchmark ColoredTrailsModel across board sizes, agent counts and agent strategies.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_model --preset quick --output bench.json
+    python -m benchmarks.bench_model --preset quick --compare bench.json
+
+Each scenario reports per-step latency percentiles, the mean time per step
+spent in each phase and the peak traced memory of building the model and
+running it. Only steps of running games are measured: when a game ends, the
+scenario goes on with a new game of the next seed. Planning and movement
+are the two halves of a step; pathfinding and need computation are
+measured inside them, so they overlap with those.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+from constants import COLORS
+from model.game_model import ColoredTrailsModel
+from model.market import TokenMarket
+from model.parallel import ParallelPlanning
+from model.scenario import Scenario, AGENT_CLASSES
+import agents.player_agent as player_module
+import agents.strategic_negotiator_agent as strategic_module
+import agents.collaborative_pathfinder_agent as collaborative_module
+
+PRESETS = {
+    "quick": {"boards": [(7, 5), (50, 50)], "agents": [3, 50], "steps": 10},
+    "full": {"boards": [(7, 5), (50, 50), (200, 200), (500, 500)], "agents": [3, 50, 500, 5000], "steps": 20,
+             # Searching strategies plan per agent over the whole board; beyond tiles x agents
+             # of about this much a step takes minutes, so those scenarios are skipped
+             "max_tile_agents": {"strategic": 200_000, "collaborative": 2_000_000}},
+}
+
+# Games tried per scenario before giving up on collecting its steps
+MAX_GAMES = 50
+
+PHASES = ("planning", "pathfinding", "needs", "trading", "movement")
+
+
+def build_model(width, height, n_agents, agent_name, seed, planning=None):
+    """Random starts and endowments, roughly enough tokens to cross the board"""
+    per_color = max(1, (width + height) // len(COLORS))
+    scenario = Scenario(width, height, n_agents, agent_mix={agent_name: 1},
+                        token_range=(0, per_color), seed=seed)
+    return ColoredTrailsModel(seed=seed, scenario=scenario, planning=planning)
+
+
+class PhaseTimer:
+    """Accumulates wall time per phase by temporarily wrapping the hot functions"""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._running = dict.fromkeys(PHASES, False)
+        self._patches = []
+
+    def wrap(self, owner, name, phase):
+        original = getattr(owner, name)
+        totals = self.totals
+        running = self._running
+
+        @wraps(original)
+        def timed(*args, **kwargs):
+            # Only the outermost call of a phase counts, so nested hot functions aren't counted twice
+            if running[phase]:
+                return original(*args, **kwargs)
+            running[phase] = True
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                totals[phase] += time.perf_counter() - start
+                running[phase] = False
+
+        setattr(owner, name, timed)
+        self._patches.append((owner, name, original))
+
+    @contextmanager
+    def installed(self):
+        for agent_class in AGENT_CLASSES.values():
+            self.wrap(agent_class, "step", "planning")
+            self.wrap(agent_class, "advance", "movement")
+        for module in (player_module, strategic_module, collaborative_module):
+            for name in ("find_best_path", "find_affordable_path"):
+                if hasattr(module, name):
+                    self.wrap(module, name, "pathfinding")
+            self.wrap(module, "needs_from_counts", "needs")
+        self.wrap(strategic_module, "plan_optimal_path", "pathfinding")
+        self.wrap(collaborative_module.CollaborativePathfinderAgent, "find_collaborative_path", "pathfinding")
+        self.wrap(TokenMarket, "clear", "trading")
+        self.wrap(ParallelPlanning, "run", "planning")
+        try:
+            yield self
+        finally:
+            for owner, name, original in reversed(self._patches):
+                setattr(owner, name, original)
+            self._patches.clear()
+
+
+def live_steps(width, height, n_agents, agent_name, steps, seed, planning=None):
+    """
+    Step games of successive seeds, yielding once per step that advanced a running game.
+
+    A finished game is replaced by the next seed's, up to MAX_GAMES games, so
+    games that end early (or deadlock before their first step) don't cut the
+    scenario short. Yields (seconds, game, model) triples.
+    """
+    played = 0
+    for game in range(MAX_GAMES):
+        model = build_model(width, height, n_agents, agent_name, seed + game, planning)
+        model.running = True
+        while model.running:
+            before = model.schedule.steps
+            start = time.perf_counter()
+            model.step()
+            seconds = time.perf_counter() - start
+            if model.schedule.steps > before:
+                yield seconds, game, model
+                played += 1
+                if played == steps:
+                    return
+
+
+def run_scenario(width, height, n_agents, agent_name, steps, seed, measure_memory=True,
+                 planning_workers=None):
+    planning = ParallelPlanning(planning_workers) if planning_workers else None
+
+    timer = PhaseTimer()
+    with timer.installed():
+        start = time.perf_counter()
+        build_model(width, height, n_agents, agent_name, seed, planning)
+        build_seconds = time.perf_counter() - start
+        step_seconds = []
+        games = 0
+        model = None
+        for seconds, game, model in live_steps(width, height, n_agents, agent_name, steps, seed, planning):
+            step_seconds.append(seconds)
+            games = game + 1
+
+    name = f"{width}x{height}-{n_agents}-{agent_name}"
+    if planning_workers:
+        name += f"-p{planning_workers}"
+    result = {
+        "name": name,
+        "width": width,
+        "height": height,
+        "agents": n_agents,
+        "agent_class": agent_name,
+        "steps": len(step_seconds),
+        "games": games,
+        "planning_workers": planning_workers,
+        "build_ms": build_seconds * 1000,
+        "step_ms": latency_summary(step_seconds),
+        "phase_ms_per_step": {phase: total * 1000 / max(len(step_seconds), 1)
+                              for phase, total in timer.totals.items()},
+        "path_cache": model.path_cache.info() if model is not None else None,
+    }
+
+    if measure_memory:
+        # Separate run: tracing allocations would distort the timings above
+        tracemalloc.start()
+        for _ in live_steps(width, height, n_agents, agent_name, steps, seed, planning):
+            pass
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    if planning is not None:
+        planning.close()
+    return result
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds or [0.0]) * 1000
+    return {
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p90": float(np.percentile(ms, 90)),
+        "p99": float(np.percentile(ms, 99)),
+        "max": float(ms.max()),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print step latency ratios against a baseline; return the regressed scenario names"""
+    previous = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    regressions = []
+    for scenario in results["scenarios"]:
+        old = previous.get(scenario["name"])
+        if old is None:
+            print(f"{scenario['name']:<40} new")
+            continue
+        ratio = scenario["step_ms"]["p50"] / max(old["step_ms"]["p50"], 1e-9)
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{scenario['name']:<40} p50 {old['step_ms']['p50']:9.3f} -> {scenario['step_ms']['p50']:9.3f} ms"
+              f"  x{ratio:5.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(scenario["name"])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--agent-class", choices=sorted(AGENT_CLASSES), action="append",
+                        help="restrict to these strategies (repeatable)")
+    parser.add_argument("--steps", type=int, help="steps per scenario (default from preset)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--planning-workers", type=int,
+                        help="run the planning phase on this many parallel workers")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p50 slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    steps = args.steps or preset["steps"]
+    scenarios = []
+    limits = preset.get("max_tile_agents", {})
+    for width, height in preset["boards"]:
+        for n_agents in preset["agents"]:
+            for agent_name in args.agent_class or AGENT_CLASSES:
+                if width * height * n_agents > limits.get(agent_name, float("inf")):
+                    print(f"{width}x{height}-{n_agents}-{agent_name:<27} skipped (too slow for this preset)")
+                    continue
+                result = run_scenario(width, height, n_agents, agent_name, steps, args.seed,
+                                      measure_memory=not args.no_memory,
+                                      planning_workers=args.planning_workers)
+                scenarios.append(result)
+                print(f"{result['name']:<40} p50 {result['step_ms']['p50']:9.3f} ms"
+                      f"  p99 {result['step_ms']['p99']:9.3f} ms", flush=True)
+
+    results = {"preset": args.preset, "steps": steps, "seed": args.seed, "scenarios": scenarios}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
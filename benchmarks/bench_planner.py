@@ -0,0 +1,84 @@
+"""
+Benchmark IncrementalPlanner repairs against searching from scratch.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_planner --sizes 100 200
+
+For every board size and kind of change between two plans, reports the mean
+time of a plan that repairs the previous search and of one that starts over
+(a new planner). "move" advances the start along the planned path with the
+weights unchanged. "rare" nudges the weight of the most expensive color,
+which covers about 2% of the tiles, and "cascade" makes that color the
+cheapest, which reroutes most of the board. "all" changes every weight.
+The last two make the planner give up on repairing and restart.
+"""
+import argparse
+import sys
+import time
+from model.bitboard import BoardIndex
+from model.board import BoardGraph
+from model.scenario import Scenario
+from pathfinding.incremental import IncrementalPlanner
+from constants import COLORS
+
+CHANGES = ("move", "rare", "cascade", "all")
+
+
+def build_board(size, seed):
+    # The last color is rare, so changing its weight touches few tiles
+    weights = dict.fromkeys(COLORS, 1.0)
+    weights[COLORS[-1]] = 0.06
+    tile_colors = Scenario(size, size, color_weights=weights, seed=seed).board()
+    return BoardGraph(size, size), tile_colors, BoardIndex(tile_colors, (size - 1, size - 1))
+
+
+def changed_weights(change, weights, step):
+    weights = dict(weights)
+    if change == "rare":
+        weights[COLORS[-1]] = 4.0 + 0.5 * (step % 2)
+    elif change == "cascade":
+        weights[COLORS[-1]] = 4.0 - 3.0 * (step % 2)
+    elif change == "all":
+        weights = {color: weight + 0.5 * (1 - 2 * (step % 2)) for color, weight in weights.items()}
+    return weights
+
+
+def run(size, change, plans, seed):
+    board_graph, tile_colors, index = build_board(size, seed)
+    goal_pos = (size - 1, size - 1)
+    weights = {color: 1.0 + i for i, color in enumerate(COLORS)}
+    planner = IncrementalPlanner(board_graph, tile_colors, goal_pos, weights, index)
+    path = planner.plan((0, 0), weights)
+    repair = fresh = 0.0
+    for step in range(plans):
+        start_pos = path[1] if change == "move" and len(path) > 1 else path[0]
+        weights = changed_weights(change, weights, step)
+
+        started = time.perf_counter()
+        path = planner.plan(start_pos, weights)
+        repair += time.perf_counter() - started
+
+        started = time.perf_counter()
+        IncrementalPlanner(board_graph, tile_colors, goal_pos, weights, index).plan(start_pos, weights)
+        fresh += time.perf_counter() - started
+    return {"size": size, "change": change, "repair_ms": 1000 * repair / plans, "fresh_ms": 1000 * fresh / plans}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100])
+    parser.add_argument("--plans", type=int, default=10, help="plans per size and change")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'board':>9} {'change':>6} {'repair ms':>10} {'fresh ms':>10}")
+    for size in args.sizes:
+        for change in CHANGES:
+            result = run(size, change, args.plans, args.seed)
+            print(f"{size:>4}x{size:<4} {change:>6} {result['repair_ms']:10.2f} {result['fresh_ms']:10.2f}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,2 @@
-COLORS = ["grey", "purple", "yellow", "green"]
\ No newline at end of file
+COLORS = ["grey", "purple", "yellow", "green"]
+COLOR_INDEX = {color: i for i, color in enumerate(COLORS)}
@@ -1,7 +1,8 @@
 from model.game_model import ColoredTrailsModel
+from model.tracing import Tracer, ConsoleSink, DEBUG
 
 if __name__ == "__main__":
-    model = ColoredTrailsModel()
+    model = ColoredTrailsModel(tracer=Tracer(DEBUG, sink=ConsoleSink()))
     model.running = True
     i = 1
     while model.running:
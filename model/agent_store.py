@@ -0,0 +1,137 @@
+from collections.abc import MutableMapping
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+
+
+class TokenView(MutableMapping):
+    """One agent's row of the store's token array, used like a color -> amount dict"""
+
+    __slots__ = ("_tokens", "_row")
+
+    def __init__(self, tokens, row):
+        self._tokens = tokens
+        self._row = row
+
+    def __getitem__(self, color):
+        return int(self._tokens[self._row, COLOR_INDEX[color]])
+
+    def __setitem__(self, color, amount):
+        self._tokens[self._row, COLOR_INDEX[color]] = amount
+
+    def __delitem__(self, color):
+        self._tokens[self._row, COLOR_INDEX[color]] = 0
+
+    def __iter__(self):
+        return iter(COLORS)
+
+    def __len__(self):
+        return len(COLORS)
+
+    def vector(self):
+        """Copy of the row, indexed like COLORS"""
+        return self._tokens[self._row].copy()
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AgentStore:
+    """
+    State of every agent as columns: a (agents x colors) token array, status
+    arrays and position coordinates, one row per agent in schedule order.
+
+    Agents hold only their row and read and write their tokens, blocked steps
+    and goal flag through it (see StoredState), so scans over all agents are
+    array operations and an id lookup is one dict access.
+    """
+
+    def __init__(self, capacity):
+        self.tokens = np.zeros((capacity, len(COLORS)), dtype=np.int64)
+        self.blocked_steps = np.zeros(capacity, dtype=np.int32)
+        self.goal_reached = np.zeros(capacity, dtype=bool)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.agents = []
+        self.row = {}
+
+    def __len__(self):
+        return len(self.agents)
+
+    def add(self, agent, tokens):
+        """Give the agent the next row, holding a copy of tokens; returns the row"""
+        row = len(self.agents)
+        if row == len(self.tokens):
+            self._grow()
+        for color, amount in tokens.items():
+            self.tokens[row, COLOR_INDEX[color]] = amount
+        self.agents.append(agent)
+        self.row[agent.unique_id] = row
+        return row
+
+    def _grow(self):
+        size = max(1, 2 * len(self.tokens))
+        for name in ("tokens", "blocked_steps", "goal_reached", "x", "y"):
+            column = getattr(self, name)
+            grown = np.zeros((size,) + column.shape[1:], dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def get(self, agent_id):
+        row = self.row.get(agent_id)
+        return None if row is None else self.agents[row]
+
+    def place(self, agent_id, pos):
+        row = self.row[agent_id]
+        self.x[row], self.y[row] = pos
+
+    def active(self):
+        """Rows, in schedule order, of the agents that are in the store"""
+        return slice(0, len(self.agents))
+
+    def any_goal_reached(self):
+        return bool(self.goal_reached[self.active()].any())
+
+    def any_blocked(self, limit=3):
+        return bool((self.blocked_steps[self.active()] >= limit).any())
+
+    def totals(self):
+        """Tokens held by all agents together, per color"""
+        return self.tokens[self.active()].sum(axis=0)
+
+
+class StoredState:
+    """Mixin for agents whose tokens, blocked steps and goal flag live in the model's AgentStore"""
+
+    def attach_store(self, store, tokens):
+        self._store = store
+        self._row = store.add(self, tokens)
+        self._tokens = TokenView(store.tokens, self._row)
+
+    @property
+    def tokens(self):
+        # The store's arrays are replaced when it grows, so refresh a stale view
+        if self._tokens._tokens is not self._store.tokens:
+            self._tokens = TokenView(self._store.tokens, self._row)
+        return self._tokens
+
+    @tokens.setter
+    def tokens(self, tokens):
+        self._store.tokens[self._row] = 0
+        for color, amount in tokens.items():
+            self._store.tokens[self._row, COLOR_INDEX[color]] = amount
+
+    @property
+    def blocked_steps(self):
+        return int(self._store.blocked_steps[self._row])
+
+    @blocked_steps.setter
+    def blocked_steps(self, steps):
+        self._store.blocked_steps[self._row] = steps
+
+    @property
+    def goal_reached(self):
+        return bool(self._store.goal_reached[self._row])
+
+    @goal_reached.setter
+    def goal_reached(self, reached):
+        self._store.goal_reached[self._row] = reached
@@ -0,0 +1,185 @@
+import random
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+from model.bitboard import color_minimums
+from model.board import BoardGraph
+from model.game_model import ColoredTrailsModel, DEFAULT_AGENTS
+
+
+def _goal_tree(width, height, goal_pos):
+    """Flat next-hop index of every tile and the tiles ordered by distance to the goal"""
+    field = BoardGraph(width, height).goal_field(goal_pos)
+    index = lambda pos: pos[0] * height + pos[1]
+    next_hop = np.zeros(width * height, dtype=np.intp)
+    for pos, hop in field.next_hop.items():
+        next_hop[index(pos)] = index(hop if hop is not None else pos)
+    order = sorted(field.distance, key=field.distance.get)
+    return next_hop, np.array([index(pos) for pos in order], dtype=np.intp)
+
+
+class PlayerBatch:
+    """
+    B independent games of PlayerAgents played in lockstep as arrays.
+
+    Boards are (B, tiles) color indices, inventories (B, agents, colors) and
+    positions (B, agents) flat tile indices. A PlayerAgent always follows the
+    goal field's next hops, so the path from any tile and its color counts are
+    precomputed per board and a step is a handful of array operations over
+    every game at once: needs from the path counts, greedy matching of every
+    color's excess to the needs in agent order, then the moves. The outcome of
+    each game is the one ColoredTrailsModel with PlayerAgents produces,
+    including the early stop on deadlock (see validate_against_model).
+
+    As in the object model, agents must not start on the goal.
+    """
+
+    def __init__(self, colors, starts, tokens, goal_pos=None, early_stop=True):
+        colors = np.asarray(colors, dtype=np.uint8)
+        self.games, self.width, self.height = colors.shape
+        self.goal_pos = goal_pos if goal_pos is not None else (self.width - 1, self.height - 1)
+        self.goal = self.goal_pos[0] * self.height + self.goal_pos[1]
+        self.early_stop = early_stop
+        self.colors = colors.reshape(self.games, -1)
+        starts = np.asarray(starts, dtype=np.intp)
+        self.pos = starts[..., 0] * self.height + starts[..., 1]
+        self.tokens = np.array(tokens, dtype=np.int64)
+        self.n_agents = self.pos.shape[1]
+
+        games = self.games
+        self.blocked_steps = np.zeros((games, self.n_agents), dtype=np.int64)
+        self.goal_reached = np.zeros((games, self.n_agents), dtype=bool)
+        self.running = np.ones(games, dtype=bool)
+        self.deadlocked = np.zeros(games, dtype=bool)
+        self.steps = np.zeros(games, dtype=np.int64)
+        self.tokens_spent = np.zeros(games, dtype=np.int64)
+        self.trades_made = np.zeros(games, dtype=np.int64)
+
+        self.next_hop, order = _goal_tree(self.width, self.height, self.goal_pos)
+        onehot = np.eye(len(COLORS), dtype=np.int64)[self.colors]
+        # Tiles of each color on the path from every tile (itself included) to the goal
+        self.path_counts = onehot.copy()
+        for tile in order[1:]:
+            self.path_counts[:, tile] += self.path_counts[:, self.next_hop[tile]]
+        # Fewest tokens of each color any path from a tile must spend (ColorRequirementField)
+        self.minimum = (color_minimums(self.colors.reshape(self.games, self.width, self.height), self.goal_pos)
+                        .reshape(self.games, -1, len(COLORS)) if early_stop else None)
+        xs, ys = np.divmod(np.arange(self.width * self.height), self.height)
+        self.distance = np.abs(xs - self.goal_pos[0]) + np.abs(ys - self.goal_pos[1])
+
+    @classmethod
+    def from_seeds(cls, seeds, early_stop=True):
+        """The default 7x5 game of ColoredTrailsModel(seed=seed) for every seed"""
+        width, height = 7, 5
+        colors = np.empty((len(seeds), width, height), dtype=np.uint8)
+        for game, seed in enumerate(seeds):
+            # The same draws, in the same order, as the model's board generation
+            rng = random.Random(seed)
+            for x in range(width):
+                for y in range(height):
+                    colors[game, x, y] = COLOR_INDEX[rng.choice(COLORS)]
+        starts = np.array([info["pos"] for info in DEFAULT_AGENTS.values()])
+        tokens = np.array([[info["tokens"].get(color, 0) for color in COLORS] for info in DEFAULT_AGENTS.values()])
+        return cls(colors, np.broadcast_to(starts, (len(seeds),) + starts.shape),
+                   np.broadcast_to(tokens, (len(seeds),) + tokens.shape), early_stop=early_stop)
+
+    @classmethod
+    def from_corpus(cls, corpus, indices=None, early_stop=True):
+        """Records of a BoardCorpus (all of them unless indices are given); one goal for all"""
+        records = corpus.records if indices is None else corpus.records[indices]
+        return cls(records["colors"], records["starts"], records["tokens"],
+                   goal_pos=tuple(int(v) for v in records["goal"][0]), early_stop=early_stop)
+
+    def _deadlocked(self, games):
+        pool = self.tokens[games].sum(axis=1)
+        pos = self.pos[games]
+        minimum = np.take_along_axis(self.minimum[games], pos[..., None], axis=1)
+        needed = np.maximum(self.distance[pos], minimum.sum(axis=2))
+        feasible = (minimum <= pool[:, None, :]).all(axis=2) & (needed <= pool.sum(axis=1)[:, None])
+        return ~feasible.any(axis=1)
+
+    def step(self):
+        """Play one step of every game still running"""
+        games = np.flatnonzero(self.running)
+        if len(games) == 0:
+            return
+        if self.early_stop:
+            # A game deadlocked from the start stops in its first step without playing it
+            first = games[self.steps[games] == 0]
+            stuck = first[self._deadlocked(first)]
+            self.deadlocked[stuck] = True
+            self.running[stuck] = False
+            self.steps[stuck] += 1
+            games = np.flatnonzero(self.running)
+
+        tokens = self.tokens[games]
+        pos = self.pos[games]
+        counts = np.take_along_axis(self.path_counts[games], pos[..., None], axis=1)
+        needs = np.maximum(counts - tokens, 0)
+        # Every color an agent doesn't lack is offered in full
+        excess = np.where(needs > 0, 0, tokens)
+
+        # Lay needs and excess of each color end to end in agent order; the
+        # overlap of giver g's interval with receiver r's is what g hands r
+        need_end = np.cumsum(needs, axis=1)
+        excess_end = np.cumsum(excess, axis=1)
+        total = np.minimum(need_end[:, -1], excess_end[:, -1])[:, None, None, :]
+        upper = np.minimum(np.minimum(excess_end[:, :, None, :], need_end[:, None, :, :]), total)
+        lower = np.maximum((excess_end - excess)[:, :, None, :], (need_end - needs)[:, None, :, :])
+        amounts = np.maximum(upper - lower, 0)
+        tokens += amounts.sum(axis=1) - amounts.sum(axis=2)
+        self.trades_made[games] += (amounts > 0).sum(axis=(1, 2, 3))
+
+        # Move onto the next hop if a token of its color is at hand
+        next_tile = self.next_hop[pos]
+        color = np.take_along_axis(self.colors[games], next_tile, axis=1)
+        held = np.take_along_axis(tokens, color[..., None], axis=2)[..., 0]
+        moves = held > 0
+        np.put_along_axis(tokens, color[..., None], (held - moves)[..., None], axis=2)
+        self.tokens[games] = tokens
+        self.pos[games] = np.where(moves, next_tile, pos)
+        self.blocked_steps[games] = np.where(moves, 0, self.blocked_steps[games] + 1)
+        self.goal_reached[games] |= self.pos[games] == self.goal
+        self.tokens_spent[games] += moves.sum(axis=1)
+        self.steps[games] += 1
+
+        ended = self.goal_reached[games].any(axis=1) | (self.blocked_steps[games] >= 3).any(axis=1)
+        if self.early_stop:
+            open_games = games[~ended]
+            stuck = open_games[self._deadlocked(open_games)]
+            self.deadlocked[stuck] = True
+        self.running[games[ended]] = False
+        if self.early_stop:
+            self.running[stuck] = False
+
+    def run(self, max_steps=100):
+        for _ in range(max_steps):
+            if not self.running.any():
+                break
+            self.step()
+        return self
+
+    def outcomes(self):
+        """One dict per game, with the fields of batch.play (agents by their agents_infos key, from 0)"""
+        return [
+            {
+                "steps": int(self.steps[game]),
+                "reached_goal": np.flatnonzero(self.goal_reached[game]).tolist(),
+                "deadlocked": bool(self.deadlocked[game]),
+                "tokens_spent": int(self.tokens_spent[game]),
+                "trades_made": int(self.trades_made[game]),
+            }
+            for game in range(self.games)
+        ]
+
+
+def validate_against_model(seeds, max_steps=100):
+    """Seeds whose default game ends differently in PlayerBatch and in batch.play's ColoredTrailsModel run"""
+    from batch import play
+
+    batch = PlayerBatch.from_seeds(seeds).run(max_steps)
+    mismatches = []
+    for seed, outcome in zip(seeds, batch.outcomes()):
+        expected = play(ColoredTrailsModel(seed=seed), seed, max_steps)
+        if outcome != {key: expected[key] for key in outcome}:
+            mismatches.append(seed)
+    return mismatches
@@ -0,0 +1,183 @@
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+
+
+class BitGrid:
+    """
+    Sets of tiles of a (width, height) grid as Python int bitsets, bit x * height + y.
+
+    Python ints give arbitrary-size bitwise operations that run in C over
+    machine words, so growing a set by one step in every direction (dilate)
+    costs a handful of big-int operations however large the board is.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.full = (1 << self.size) - 1
+        first_row = int.from_bytes(np.packbits(np.arange(self.size) % height == 0, bitorder="little").tobytes(),
+                                   "little")
+        # Moving along y must not wrap from the end of one column to the start of the next
+        self._not_first_row = self.full & ~first_row
+        self._not_last_row = self.full & ~(first_row << (height - 1))
+
+    def from_mask(self, mask):
+        return int.from_bytes(np.packbits(np.asarray(mask, dtype=bool).reshape(-1), bitorder="little").tobytes(),
+                              "little")
+
+    def to_mask(self, bits):
+        raw = np.frombuffer(bits.to_bytes((self.size + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:self.size].view(bool).reshape(self.width, self.height)
+
+    def bit(self, pos):
+        return 1 << (pos[0] * self.height + pos[1])
+
+    def neighbors(self, bits):
+        """Tiles next to any tile of bits"""
+        h = self.height
+        return ((bits << h) | (bits >> h) | ((bits << 1) & self._not_first_row)
+                | ((bits >> 1) & self._not_last_row)) & self.full
+
+
+def zero_one_levels(grid, free, costly, sources):
+    """
+    Tiles by the fewest costly tiles a path from them to `sources` enters, as one bitset per count.
+
+    Entering a free tile costs nothing, a costly one costs one; other tiles
+    are walls. Each level is the zero-cost closure of the tiles one costly
+    step beyond the previous level.
+    """
+    reached = seeds = sources
+    levels = []
+    while seeds:
+        level = frontier = seeds
+        while True:
+            fresh = grid.neighbors(frontier & free) & ~reached
+            if not fresh:
+                break
+            reached |= fresh
+            level |= fresh
+            frontier = fresh
+        levels.append(level)
+        seeds = grid.neighbors(level & costly) & ~reached
+        reached |= seeds
+    return levels
+
+
+def color_minimums(colors, goal_pos):
+    """
+    Fewest tokens of each color any path to the goal spends, as (..., width, height, colors).
+
+    colors is one (width, height) board or a stack (..., width, height) of
+    them; goal_pos is one (x, y) for all of them or one per board. A path
+    spends a token of a color for every tile of it that it enters, the goal
+    included. Stacked boards are laid side by side one empty column apart and
+    solved together by one bitset 0-1 BFS per color.
+    """
+    colors = np.asarray(colors)
+    width, height = colors.shape[-2:]
+    boards = colors.reshape(-1, width, height)
+    count = len(boards)
+    goals = np.broadcast_to(np.asarray(goal_pos), colors.shape[:-2] + (2,)).reshape(count, 2)
+
+    layout = np.full((count, width + 1, height), len(COLORS), dtype=np.int64)
+    layout[:, :width] = boards
+    grid = BitGrid(count * (width + 1), height)
+    on_board = grid.from_mask(layout < len(COLORS))
+    goal_mask = np.zeros(layout.shape, dtype=bool)
+    goal_mask[np.arange(count), goals[:, 0], goals[:, 1]] = True
+    goal_bits = grid.from_mask(goal_mask)
+
+    minimum = np.zeros((count, width, height, len(COLORS)), dtype=np.int64)
+    for color in range(len(COLORS)):
+        costly = grid.from_mask(layout == color)
+        # Walking backwards from the goal, leaving a tile of the color is entering it forwards
+        levels = zero_one_levels(grid, on_board & ~costly, costly, goal_bits)
+        counts = minimum[..., color]
+        for level_count, level in enumerate(levels):
+            counts[grid.to_mask(level).reshape(layout.shape)[:, :width]] = level_count
+    return minimum.reshape(colors.shape + (len(COLORS),))
+
+
+class BoardIndex:
+    """
+    Tile bitsets of one board version, for affordability questions towards its goal.
+
+    Holds the tiles of every color as a bitset. Restricting the tiles a path
+    may enter to a set of colors (those an agent holds tokens of, say) gives
+    the goal's component within those colors, a distance-to-goal transform
+    and a fewest-tiles-entered transform. Each is computed on first use per
+    color set and cached, so later questions are a bit test or an array lookup.
+    """
+
+    def __init__(self, tile_colors, goal_pos):
+        self.version = tile_colors.version
+        self.goal_pos = goal_pos
+        self.grid = BitGrid(*tile_colors.colors.shape)
+        self.color_bits = {color: self.grid.from_mask(tile_colors.colors == COLOR_INDEX[color]) for color in COLORS}
+        self._goal_bit = self.grid.bit(goal_pos)
+        self._positions = {}
+        self._components = {}
+        self._distances = {}
+        self._fewest = {}
+
+    def tiles(self, colors):
+        bits = 0
+        for color in colors:
+            bits |= self.color_bits[color]
+        return bits
+
+    def mask(self, colors):
+        """(width, height) bool array of the tiles of the given colors"""
+        return self.grid.to_mask(self.tiles(colors))
+
+    def positions(self, color):
+        """The (x, y) tiles of one color, in board order"""
+        if color not in self._positions:
+            self._positions[color] = list(map(tuple, np.argwhere(self.mask((color,))).tolist()))
+        return self._positions[color]
+
+    def component(self, colors):
+        """Tiles of the given colors joined to the goal through tiles of those colors"""
+        colors = frozenset(colors)
+        if colors not in self._components:
+            allowed = self.tiles(colors)
+            reached = frontier = self._goal_bit & allowed
+            while frontier:
+                frontier = self.grid.neighbors(frontier) & allowed & ~reached
+                reached |= frontier
+            self._components[colors] = reached
+        return self._components[colors]
+
+    def can_reach(self, pos, colors):
+        """Whether some path from pos to the goal only enters tiles of the given colors"""
+        return pos == self.goal_pos or bool(self.grid.neighbors(self.grid.bit(pos)) & self.component(colors))
+
+    def distance(self, colors):
+        """(width, height) steps to the goal entering only tiles of the given colors, -1 where impossible"""
+        colors = frozenset(colors)
+        if colors not in self._distances:
+            allowed = self.tiles(colors)
+            distance = np.full((self.grid.width, self.grid.height), -1, dtype=np.int64)
+            reached = level = self._goal_bit
+            steps = 0
+            while level:
+                distance[self.grid.to_mask(level)] = steps
+                level = self.grid.neighbors(level & allowed) & ~reached
+                reached |= level
+                steps += 1
+            self._distances[colors] = distance
+        return self._distances[colors]
+
+    def fewest(self, colors):
+        """(width, height) fewest tiles of the given colors any path to the goal enters"""
+        colors = frozenset(colors)
+        if colors not in self._fewest:
+            costly = self.tiles(colors)
+            fewest = np.zeros((self.grid.width, self.grid.height), dtype=np.int64)
+            for count, level in enumerate(zero_one_levels(self.grid, self.grid.full & ~costly, costly,
+                                                          self._goal_bit)):
+                fewest[self.grid.to_mask(level)] = count
+            self._fewest[colors] = fewest
+        return self._fewest[colors]
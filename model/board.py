@@ -0,0 +1,180 @@
+from collections import deque
+from hashlib import blake2b
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+from model.bitboard import color_minimums
+
+
+class GoalField:
+    """Distance and next-hop maps towards a single goal, built by reverse BFS"""
+
+    def __init__(self, board_graph, goal_pos):
+        self.goal_pos = goal_pos
+        self.distance = {goal_pos: 0}
+        self.next_hop = {goal_pos: None}
+        queue = deque([goal_pos])
+        while queue:
+            node = queue.popleft()
+            for neighbor in board_graph.neighbors(node):
+                if neighbor not in self.distance:
+                    self.distance[neighbor] = self.distance[node] + 1
+                    self.next_hop[neighbor] = node
+                    queue.append(neighbor)
+
+    def path_from(self, start_pos):
+        """Walk the next-hop map from start_pos to the goal"""
+        if start_pos not in self.next_hop:
+            raise ValueError(f"{start_pos} cannot reach goal {self.goal_pos}")
+        path = [start_pos]
+        node = self.next_hop[start_pos]
+        while node is not None:
+            path.append(node)
+            node = self.next_hop[node]
+        return path
+
+
+class ColorRequirementField:
+    """
+    For every tile, the fewest tokens of each color any path to the goal must spend.
+
+    Computed for all colors by model.bitboard.color_minimums(): stepping onto
+    a tile of a color costs one token of it, any other tile is free.
+    """
+
+    def __init__(self, board_graph, tile_colors, goal_pos, colors):
+        self.goal_pos = goal_pos
+        minimum = color_minimums(tile_colors.colors, goal_pos)
+        self._array = minimum[..., [COLOR_INDEX[color] for color in colors]]
+        self.shape = self._array.shape
+        self._rows = None
+
+    def as_array(self):
+        """The minimums as a (width, height, colors) array"""
+        return self._array
+
+    def at(self, pos):
+        """The minimums of one tile as a list, for per-tile loops"""
+        if self._rows is None:
+            self._rows = self._array.tolist()
+        return self._rows[pos[0]][pos[1]]
+
+
+class BoardGraph:
+    """4-connected grid graph of the board, built once per model and shared by every agent"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._goal_fields = {}
+
+    def __contains__(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def nodes(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                yield (x, y)
+
+    def neighbors(self, pos):
+        x, y = pos
+        if x > 0:
+            yield (x - 1, y)
+        if x < self.width - 1:
+            yield (x + 1, y)
+        if y > 0:
+            yield (x, y - 1)
+        if y < self.height - 1:
+            yield (x, y + 1)
+
+    def goal_field(self, goal_pos):
+        """Return the (cached) distance/next-hop field rooted at goal_pos"""
+        field = self._goal_fields.get(goal_pos)
+        if field is None:
+            field = GoalField(self, goal_pos)
+            self._goal_fields[goal_pos] = field
+        return field
+
+    def shortest_path(self, start_pos, goal_pos):
+        return self.goal_field(goal_pos).path_from(start_pos)
+
+
+class ColorBoard:
+    """
+    Tile colors stored as a compact (width, height) uint8 array of indices into COLORS.
+
+    Indexing with a position still returns the color name, so it can be used
+    wherever a pos -> color mapping is expected; vectorized code works on
+    `colors` directly. `version` is a digest of the layout, so caches keyed on
+    it stop matching as soon as a tile is recolored, and two boards with the
+    same layout share their entries.
+    """
+
+    def __init__(self, colors):
+        self.colors = np.asarray(colors, dtype=np.uint8)
+        self.width, self.height = self.colors.shape
+        self._update_version()
+
+    def _update_version(self):
+        digest = blake2b(self.colors.tobytes(), digest_size=8)
+        digest.update(np.array(self.colors.shape, dtype=np.int64).tobytes())
+        self.version = digest.digest()
+
+    def set_color(self, pos, color):
+        self.colors[pos] = COLOR_INDEX[color]
+        self._update_version()
+
+    @classmethod
+    def from_mapping(cls, width, height, tile_colors):
+        colors = np.zeros((width, height), dtype=np.uint8)
+        for (x, y), color in tile_colors.items():
+            colors[x, y] = COLOR_INDEX[color]
+        return cls(colors)
+
+    def __getitem__(self, pos):
+        return COLORS[self.colors.item(pos)]
+
+    def __contains__(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def path_colors(self, path):
+        """Color index of every tile on the path"""
+        if not len(path):
+            return np.zeros(0, dtype=np.uint8)
+        xs, ys = np.asarray(path, dtype=np.intp).T
+        return self.colors[xs, ys]
+
+    def histogram(self, path):
+        """Number of tiles of each color on the path"""
+        return np.bincount(self.path_colors(path), minlength=len(COLORS))
+
+
+class PathCounts:
+    """
+    Per-color tile counts over every suffix of a path, served from cumulative counts.
+
+    Built once when an agent picks a path; advancing along it only moves an
+    offset, so the counts still ahead cost O(colors) instead of a walk over
+    the remaining tiles.
+    """
+
+    def __init__(self, board, path):
+        colors = board.path_colors(path)
+        self.cumulative = np.zeros((len(colors) + 1, len(COLORS)), dtype=np.int64)
+        self.cumulative[np.arange(1, len(colors) + 1), colors] = 1
+        np.cumsum(self.cumulative, axis=0, out=self.cumulative)
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.cumulative) - 1 - self.offset
+
+    def advance(self, steps=1):
+        self.offset = min(self.offset + steps, len(self.cumulative) - 1)
+
+    def remaining(self):
+        """Counts over the tiles from the current one to the end of the path"""
+        return self.cumulative[-1] - self.cumulative[self.offset]
+
+    def window(self, length):
+        """Counts over the next `length` tiles, starting with the current one"""
+        end = min(self.offset + length, len(self.cumulative) - 1)
+        return self.cumulative[end] - self.cumulative[self.offset]
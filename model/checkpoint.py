@@ -0,0 +1,159 @@
+"""
+Binary checkpoints of a running game, and replay from them.
+
+A checkpoint is a single uncompressed .npz file: the board and the agent
+store as raw arrays, plus one pickled blob with everything else (RNG state,
+early stop and parallel planning options, token economy, market counters
+and each agent's own attributes: path, needs, trade history, planner
+state). Restoring rebuilds the model from it, so the following steps are
+exactly those of the original run.
+
+Replay a checkpoint from the repository root, printing every event:
+
+    python -m model.checkpoint checkpoints/step_00000040.ckpt --steps 5
+"""
+import argparse
+import importlib
+import os
+import pickle
+import numpy as np
+from model.board import ColorBoard, PathCounts
+from model.game_model import ColoredTrailsModel
+from model.parallel import ParallelPlanning
+from model.scenario import agents_infos_from_arrays
+from model.tracing import Tracer, ConsoleSink, DEBUG
+
+# Agent attributes that point into the model, rebuilt on restore instead of saved
+_BOUND_ATTRIBUTES = {"model", "unique_id", "pos", "_store", "_tokens", "_row", "path_counts"}
+
+
+def _class_name(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _load_class(name):
+    module, qualname = name.split(":")
+    return getattr(importlib.import_module(module), qualname)
+
+
+def save_checkpoint(model, path):
+    """Write the complete state of the model between two steps to path"""
+    store = model.agent_store
+    rows = store.active()
+    agents = store.agents
+    state = {
+        "goal_pos": model.goal_pos,
+        "steps": model.schedule.steps,
+        "time": model.schedule.time,
+        "running": model.running,
+        "deadlocked": model.deadlocked,
+        "tokens_spent": model.tokens_spent,
+        "random": model.random.getstate(),
+        # Options that change how the game unfolds, restored unless overridden
+        "early_stop": model.early_stop,
+        "planning": None if model.planning is None else {"workers": model.planning.workers,
+                                                         "processes": model.planning.processes},
+        "agent_ids": [agent.agent_id for agent in agents],
+        "agent_classes": [_class_name(type(agent)) for agent in agents],
+        # Pickled together so agents keep sharing the economy's live views
+        "economy": model.token_economy,
+        "agents": [{name: value for name, value in vars(agent).items() if name not in _BOUND_ATTRIBUTES}
+                   for agent in agents],
+        "trades_made": model.market.trades_made,
+        "last_trades": model.market.last_trades,
+    }
+    with open(path, "wb") as f:
+        np.savez(f, board=model.tile_colors.colors, tokens=store.tokens[rows],
+                 blocked_steps=store.blocked_steps[rows], goal_reached=store.goal_reached[rows],
+                 x=store.x[rows], y=store.y[rows],
+                 state=np.frombuffer(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8))
+
+
+class _Snapshot:
+    """The board and agents of a checkpoint, in the shape of a model scenario"""
+
+    def __init__(self, arrays, state):
+        self.arrays = arrays
+        self.state = state
+        self.width, self.height = arrays["board"].shape
+        self.goal_pos = state["goal_pos"]
+
+    def board(self):
+        return ColorBoard(self.arrays["board"])
+
+    def agents_infos(self):
+        starts = np.stack((self.arrays["x"], self.arrays["y"]), axis=1)
+        classes = [_load_class(name) for name in self.state["agent_classes"]]
+        infos = agents_infos_from_arrays(starts, self.arrays["tokens"], classes)
+        return {agent_id: infos[row] for row, agent_id in enumerate(self.state["agent_ids"])}
+
+
+def load_checkpoint(path, **model_kwargs):
+    """Rebuild the model saved at path; model_kwargs (tracer, metrics, ...) are passed on"""
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    state = pickle.loads(arrays.pop("state").tobytes())
+    model_kwargs.setdefault("early_stop", state["early_stop"])
+    if state["planning"] is not None:
+        model_kwargs.setdefault("planning", ParallelPlanning(**state["planning"]))
+
+    model = ColoredTrailsModel(scenario=_Snapshot(arrays, state), **model_kwargs)
+    model.schedule.steps = state["steps"]
+    model.schedule.time = state["time"]
+    model.running = state["running"]
+    model.deadlocked = state["deadlocked"]
+    model.tokens_spent = state["tokens_spent"]
+    model.random.setstate(state["random"])
+    model.token_economy = state["economy"]
+
+    store = model.agent_store
+    rows = store.active()
+    store.blocked_steps[rows] = arrays["blocked_steps"]
+    store.goal_reached[rows] = arrays["goal_reached"]
+    for agent, attributes in zip(store.agents, state["agents"]):
+        for name, value in attributes.items():
+            setattr(agent, name, value)
+        if hasattr(agent, "path_to_goal"):
+            agent.path_counts = PathCounts(model.tile_colors, agent.path_to_goal)
+        if getattr(agent, "planner", None) is not None:
+            agent.planner.attach(model.board_graph, model.tile_colors, model.board_index())
+
+    model.market.trades_made = state["trades_made"]
+    model.market.last_trades = state["last_trades"]
+    return model
+
+
+def replay(path, steps, **model_kwargs):
+    """Restore the checkpoint at path and run up to `steps` more steps of the game"""
+    model = load_checkpoint(path, **model_kwargs)
+    for _ in range(steps):
+        if not model.running:
+            break
+        model.step()
+    return model
+
+
+class Checkpointer:
+    """Saves the model to directory every `every` steps, for ColoredTrailsModel(checkpoints=...)"""
+
+    def __init__(self, directory, every=10):
+        self.directory = directory
+        self.every = every
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, step):
+        return os.path.join(self.directory, f"step_{step:08d}.ckpt")
+
+    def after_step(self, model):
+        if model.schedule.steps % self.every == 0:
+            save_checkpoint(model, self.path(model.schedule.steps))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a game from a checkpoint, printing every event")
+    parser.add_argument("path")
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    model = replay(args.path, args.steps, tracer=Tracer(DEBUG, sink=ConsoleSink()))
+    print(f"stopped at step {model.schedule.steps}, running={model.running}")
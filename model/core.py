@@ -0,0 +1,112 @@
+"""
+Headless simulation core: the parts of Mesa that ColoredTrailsModel uses.
+
+Model, Agent, MultiGrid and SimultaneousActivation follow the Mesa 3 API
+(seeded model.random, agent ids assigned by the model starting at 1,
+place/move on a bounded grid, step-then-advance activation), so the game
+and its agents run unchanged without importing Mesa. Batch workers only
+pay for numpy.
+"""
+import itertools
+import random
+
+
+class Model:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.random()
+        self._seed = seed
+        self.random = random.Random(seed)
+        self.running = True
+        self._ids = itertools.count(1)
+
+    def next_id(self):
+        return next(self._ids)
+
+    def step(self):
+        pass
+
+
+class Agent:
+    def __init__(self, model):
+        self.unique_id = model.next_id()
+        self.model = model
+        self.pos = None
+
+    @property
+    def random(self):
+        return self.model.random
+
+    def step(self):
+        pass
+
+    def advance(self):
+        pass
+
+
+class MultiGrid:
+    """Bounded grid of cells that may hold several agents each"""
+
+    def __init__(self, width, height, torus=False):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self._cells = {}
+
+    def out_of_bounds(self, pos):
+        x, y = pos
+        return not (0 <= x < self.width and 0 <= y < self.height)
+
+    def place_agent(self, agent, pos):
+        if self.out_of_bounds(pos):
+            raise ValueError(f"{pos} is outside the {self.width}x{self.height} grid")
+        self._cells.setdefault(pos, []).append(agent)
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        cell = self._cells[agent.pos]
+        cell.remove(agent)
+        if not cell:
+            del self._cells[agent.pos]
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def get_cell_list_contents(self, positions):
+        if isinstance(positions, tuple):
+            positions = [positions]
+        return [agent for pos in positions for agent in self._cells.get(pos, ())]
+
+
+class SimultaneousActivation:
+    """Every agent steps, then every agent advances"""
+
+    def __init__(self, model):
+        self.model = model
+        self.steps = 0
+        self.time = 0
+        self._agents = {}
+
+    @property
+    def agents(self):
+        return list(self._agents.values())
+
+    def get_agent_count(self):
+        return len(self._agents)
+
+    def add(self, agent):
+        self._agents[agent.unique_id] = agent
+
+    def remove(self, agent):
+        del self._agents[agent.unique_id]
+
+    def step(self):
+        agents = self.agents
+        for agent in agents:
+            agent.step()
+        for agent in agents:
+            agent.advance()
+        self.steps += 1
+        self.time += 1
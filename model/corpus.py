@@ -0,0 +1,135 @@
+"""
+Board corpora: many fixed-size game records in one file, read through numpy.memmap.
+
+Generate one from the repository root:
+
+    python -m model.corpus boards.ctc --boards 10000 --width 20 --height 20 --agents 5
+
+Every record holds a board's color array, the goal, each agent's start tile
+and token vector, and the seed of the game, so the same boards can be
+replayed with every agent strategy, by any number of worker processes that
+share the file's pages.
+"""
+import argparse
+import numpy as np
+from constants import COLORS
+from model.board import ColorBoard
+from model.game_model import ColoredTrailsModel
+from model.scenario import Scenario, AGENT_CLASSES, agents_infos_from_arrays
+
+MAGIC = b"CTCORPUS"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("width", "<u4"), ("height", "<u4"),
+    ("agents", "<u4"), ("colors", "<u4"), ("count", "<u8"),
+])
+
+
+def record_dtype(width, height, n_agents):
+    return np.dtype([
+        ("seed", "<u8"),
+        ("goal", "<i4", (2,)),
+        ("colors", "u1", (width, height)),
+        ("starts", "<i4", (n_agents, 2)),
+        ("tokens", "<i4", (n_agents, len(COLORS))),
+    ])
+
+
+def write_corpus(path, boards, width, height, n_agents, token_range=(0, 2), color_weights=None,
+                 goal_pos=None, seed=0):
+    """Generate `boards` random records into a new corpus file at path"""
+    header = np.zeros((), dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = FORMAT_VERSION
+    header["width"], header["height"], header["agents"] = width, height, n_agents
+    header["colors"] = len(COLORS)
+    header["count"] = boards
+    with open(path, "wb") as f:
+        f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+
+    records = np.memmap(path, dtype=record_dtype(width, height, n_agents), mode="r+",
+                        offset=HEADER_SIZE, shape=(boards,))
+    # One independent stream per board, like the batch runner's game seeds
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(boards)]
+    for i, board_seed in enumerate(seeds):
+        scenario = Scenario(width, height, n_agents, color_weights=color_weights,
+                            token_range=token_range, goal_pos=goal_pos, seed=board_seed)
+        starts, tokens, _ = scenario.agent_arrays()
+        record = records[i]
+        record["seed"] = board_seed
+        record["goal"] = scenario.goal_pos
+        record["colors"] = scenario.board().colors
+        record["starts"] = starts
+        record["tokens"] = tokens
+    records.flush()
+    return BoardCorpus(path)
+
+
+class CorpusRecord:
+    """
+    One record of a corpus, usable as a ColoredTrailsModel scenario.
+
+    The board is a read-only view on the mapped file; agents all get the
+    given class, so one record can be replayed with each strategy in turn.
+    """
+
+    def __init__(self, record, agent_class):
+        self.record = record
+        self.agent_class = agent_class
+        self.width, self.height = record["colors"].shape
+        self.goal_pos = tuple(int(v) for v in record["goal"])
+        self.seed = int(record["seed"])
+
+    def board(self):
+        return ColorBoard(self.record["colors"])
+
+    def agents_infos(self):
+        starts, tokens = self.record["starts"], self.record["tokens"]
+        return agents_infos_from_arrays(starts, tokens, [self.agent_class] * len(starts))
+
+
+class BoardCorpus:
+    """Read-only, memory-mapped corpus file; records are only paged in when read"""
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != MAGIC or header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} board corpus")
+        if header["colors"] != len(COLORS):
+            raise ValueError(f"{path} was written for {header['colors']} colors, not {len(COLORS)}")
+        self.width, self.height = int(header["width"]), int(header["height"])
+        self.n_agents = int(header["agents"])
+        self.records = np.memmap(path, dtype=record_dtype(self.width, self.height, self.n_agents),
+                                 mode="r", offset=HEADER_SIZE, shape=(int(header["count"]),))
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, index, agent_class=AGENT_CLASSES["player"]):
+        return CorpusRecord(self.records[index], agent_class)
+
+    def models(self, agent_class=AGENT_CLASSES["player"], indices=None, **model_kwargs):
+        """Yield a ColoredTrailsModel per record (all of them unless indices are given)"""
+        for index in range(len(self)) if indices is None else indices:
+            record = self.record(index, agent_class)
+            yield ColoredTrailsModel(seed=record.seed, scenario=record, **model_kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a memory-mapped board corpus")
+    parser.add_argument("path")
+    parser.add_argument("--boards", type=int, default=10000)
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=5)
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--min-tokens", type=int, default=0, help="fewest tokens of each color per agent")
+    parser.add_argument("--max-tokens", type=int, default=2, help="most tokens of each color per agent")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = write_corpus(args.path, args.boards, args.width, args.height, args.agents,
+                          token_range=(args.min_tokens, args.max_tokens), seed=args.seed)
+    print(f"{len(corpus)} boards of {corpus.width}x{corpus.height} with {corpus.n_agents} agents "
+          f"written to {args.path}")
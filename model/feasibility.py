@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class FeasibilityCheck:
+    """
+    Proves that no agent can reach the goal any more, whatever trades happen.
+
+    Trades only move tokens between agents and moves only spend them, so the
+    pooled tokens of all agents bound what any one agent could ever hold. A
+    path from an agent's tile needs at least the ColorRequirementField minimum
+    of every color, and at least as many tokens in total as the larger of its
+    manhattan distance and the sum of those minimums. When no agent's bounds
+    fit in the pool, the game is deadlocked.
+    """
+
+    def __init__(self, requirements, goal_pos):
+        self.requirements = requirements
+        self.minimum = requirements.as_array()
+        self.goal_pos = goal_pos
+
+    def feasible(self, store):
+        """Per agent row, whether the pooled tokens could still take it to the goal"""
+        rows = store.active()
+        x, y = store.x[rows], store.y[rows]
+        pool = store.totals()
+        minimum = self.minimum[x, y]
+        distance = np.abs(x - self.goal_pos[0]) + np.abs(y - self.goal_pos[1])
+        needed = np.maximum(distance, minimum.sum(axis=1))
+        return (minimum <= pool).all(axis=1) & (needed <= pool.sum())
+
+    def deadlocked(self, store):
+        return not self.feasible(store).any()
@@ -1,58 +1,186 @@
-from mesa import Model
-from mesa.time import SimultaneousActivation
-from mesa.space import MultiGrid
+from model.core import Model, SimultaneousActivation, MultiGrid
 from agents.player_agent import PlayerAgent
-import random
-from utils import find_best_path
-from constants import COLORS
+from model.bitboard import BoardIndex
+from model.board import BoardGraph, ColorBoard, ColorRequirementField
+from model.token_economy import TokenEconomy
+from model.market import TokenMarket
+from model.tracing import Tracer, NeedBroadcast, Move, Deadlock
+from model.metrics import Metrics
+from model.agent_store import AgentStore
+from model.path_cache import PathCache
+from model.feasibility import FeasibilityCheck
+import numpy as np
+from utils import to_dict
+from constants import COLORS, COLOR_INDEX
+
+# Starting tiles and tokens of the default game's three agents
+DEFAULT_AGENTS = {
+    0: {"pos": (0, 0), "tokens": {"green": 1, "yellow": 1, "purple": 2}},
+    1: {"pos": (0, 4), "tokens": {"green": 2, "grey": 1}},
+    2: {"pos": (3, 2), "tokens": {"purple": 1, "yellow": 2, "grey": 1}}
+}
+
 
 class ColoredTrailsModel(Model):
-    def __init__(self):
-        super().__init__()
-        self.grid_width = 7
-        self.grid_height = 5
+    def __init__(self, seed=None, tracer=None, width=7, height=5, goal_pos=None,
+                 agents_infos=None, agent_class=PlayerAgent, metrics=None,
+                 planning=None, path_cache=None, early_stop=True, scenario=None,
+                 checkpoints=None, telemetry=None):
+        # Every random draw of the game goes through self.random, seeded here
+        super().__init__(seed=seed)
+        # A Scenario replaces the board size, goal and agents given here
+        if scenario is not None:
+            width, height, goal_pos = scenario.width, scenario.height, scenario.goal_pos
+            agents_infos = scenario.agents_infos()
+        # Structured event trace, silent unless a tracer with a level is given
+        self.tracer = tracer if tracer is not None else Tracer()
+        # Phase timers and counters, near free unless enabled
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Optional ParallelPlanning running the planning phase on worker pools
+        self.planning = planning
+        # Memoized path evaluations; pass one cache to several models to share it
+        self.path_cache = path_cache if path_cache is not None else PathCache()
+        # Stop as soon as the pooled tokens can't take anyone to the goal
+        self.early_stop = early_stop
+        self.deadlocked = False
+        self._feasibility = None
+        # Optional Checkpointer saving the game every few steps
+        self.checkpoints = checkpoints
+        # Optional TelemetryWriter recording one row per agent per step
+        self.telemetry = telemetry
+        self.grid_width = width
+        self.grid_height = height
         self.grid = MultiGrid(self.grid_width, self.grid_height, torus=False)
         self.schedule = SimultaneousActivation(self)
         self.running = False
-        self.needs_pool = {}
-        self.offers_pool = {}
+        self.tokens_spent = 0
         self.offers_mutex = 3
-        # goal position (bottom-right corner)
-        self.goal_pos = (6, 4)
-        # Generate grid with random tile colors
-        self.tile_colors = {}
-        for x in range(self.grid_width):
-            for y in range(self.grid_height):
-                color = random.choice(COLORS)
-                self.tile_colors[(x, y)] = color
-
-        # 3 initial agents placements and tokens initialisation
-        self.agents_intial_infos = {
-            0: {"pos": (0, 0), "tokens": {"green": 1, "yellow": 1, "purple": 2}},
-            1: {"pos": (0, 4), "tokens": {"green": 2, "grey": 1}},
-            2: {"pos": (3, 2), "tokens": {"purple": 1, "yellow": 2, "grey": 1}}
-        }
+        # goal position (bottom-right corner by default)
+        self.goal_pos = goal_pos if goal_pos is not None else (width - 1, height - 1)
+        # Board graph shared by every agent; the goal distance field is built on first use
+        self.board_graph = BoardGraph(self.grid_width, self.grid_height)
+        # Token economy snapshot shared by every agent, kept up to date incrementally
+        self.token_economy = TokenEconomy(self.goal_pos)
+        # Generate grid with random tile colors, stored as a compact color index array
+        if scenario is not None:
+            self.tile_colors = scenario.board()
+        else:
+            colors = np.zeros((self.grid_width, self.grid_height), dtype=np.uint8)
+            for x in range(self.grid_width):
+                for y in range(self.grid_height):
+                    color = self.random.choice(COLORS)
+                    colors[x, y] = COLOR_INDEX[color]
+            self.tile_colors = ColorBoard(colors)
 
+        # 3 initial agents placements and tokens initialisation, unless given
+        self.agents_intial_infos = agents_infos if agents_infos is not None else DEFAULT_AGENTS
+
+        # Tokens, status and positions of every agent as arrays, one row per agent
+        self.agent_store = AgentStore(len(self.agents_intial_infos))
         for agent_id, info in self.agents_intial_infos.items():
-            agent = PlayerAgent(agent_id, info["tokens"], self)
+            agent = info.get("class", agent_class)(agent_id, info["tokens"], self)
             self.grid.place_agent(agent, info["pos"])
+            self.agent_store.place(agent.unique_id, info["pos"])
             self.schedule.add(agent)
-        print("[!] : Agents intiated")
-        
+            self.token_economy.register_agent(agent.unique_id, info["pos"], agent.tokens)
+        # Needs and offers of every agent as (agents x colors) matrices, cleared once per step
+        self.market = TokenMarket(self, self.schedule.agents)
+        self._color_requirements = {}
+        self._board_index = None
+
     def step(self):
-        self.schedule.step()   
-        self.needs_pool.clear()
-        self.offers_pool.clear()
+        # Simultaneous activation with the market cleared between the two phases:
+        # every agent plans and broadcasts, then offers are matched, then everyone moves
+        # The first check runs here rather than at construction, which stays cheap on big boards
+        if self.deadlocked or (self.schedule.steps == 0 and self.detect_deadlock()):
+            self.running = False
+            return
+        metrics = self.metrics
+        metrics.step_started(self.schedule.steps)
+        agents = list(self.schedule.agents)
+
+        started = metrics.clock()
+        if self.planning is None:
+            for agent in agents:
+                agent.step()
+        else:
+            self.planning.run(self, agents)
+        metrics.record_phase("planning", started)
+
+        started = metrics.clock()
+        self.market.clear()
+        metrics.record_phase("trading", started)
+
+        started = metrics.clock()
+        for agent in agents:
+            agent.advance()
+        metrics.record_phase("movement", started)
+        if self.telemetry is not None:
+            self.telemetry.record_step(self)
+
+        started = metrics.clock()
+        self.market.reset()
+        self.token_economy.clear_needs()
+        metrics.record_phase("reset", started)
+
+        metrics.step_finished(self.schedule.steps)
+        self.schedule.steps += 1
+        self.schedule.time += 1
         # End conditions
-        blocked_agents = [a for a in self.schedule.agents if a.blocked_steps >= 3]
-        if any(a.goal_reached for a in self.schedule.agents) or blocked_agents:
+        if self.agent_store.any_goal_reached() or self.agent_store.any_blocked(3) or self.detect_deadlock():
             self.running = False
+        if self.checkpoints is not None:
+            self.checkpoints.after_step(self)
+
+    def detect_deadlock(self):
+        """Whether no redistribution of the pooled tokens can take any agent to the goal"""
+        if not self.early_stop or self.deadlocked:
+            return self.deadlocked
+        requirements = self.color_requirement_field(self.goal_pos)
+        if self._feasibility is None or self._feasibility.requirements is not requirements:
+            self._feasibility = FeasibilityCheck(requirements, self.goal_pos)
+        if self._feasibility.deadlocked(self.agent_store):
+            self.deadlocked = True
+            if self.tracer.info:
+                self.tracer.emit(Deadlock(self.schedule.steps, to_dict(self.agent_store.totals())))
+        return self.deadlocked
     
     def broadcast_needs(self, sender_id, needs):
-        self.needs_pool[sender_id] = needs
+        self.market.post_needs(sender_id, needs)
+        self.token_economy.record_needs(sender_id, needs)
+        if self.tracer.debug:
+            self.tracer.emit(NeedBroadcast(self.schedule.steps, self.agent_store.get(sender_id).agent_id, needs))
+
+    def move_agent(self, agent, pos):
+        """Spend the token for the tile at pos and move the agent onto it"""
+        color = self.tile_colors[pos]
+        if self.tracer.debug:
+            self.tracer.emit(Move(self.schedule.steps, agent.agent_id, agent.pos, pos, color))
+        agent.tokens[color] -= 1
+        self.tokens_spent += 1
+        self.token_economy.adjust_tokens(color, -1)
+        self.grid.move_agent(agent, pos)
+        self.agent_store.place(agent.unique_id, pos)
+        self.token_economy.record_position(agent.unique_id, pos)
+
+    def color_requirement_field(self, goal_pos):
+        # Per-color minimum token counts towards goal_pos, computed once per goal and board version
+        key = (goal_pos, self.tile_colors.version)
+        field = self._color_requirements.get(key)
+        if field is None:
+            field = ColorRequirementField(self.board_graph, self.tile_colors, goal_pos, COLORS)
+            if self.metrics.enabled:
+                self.metrics.count("graph_builds")
+            self._color_requirements[key] = field
+        return field
+
+    def board_index(self):
+        # Color bitsets and their transforms, rebuilt when the board changes
+        if self._board_index is None or self._board_index.version != self.tile_colors.version:
+            self._board_index = BoardIndex(self.tile_colors, self.goal_pos)
+            if self.metrics.enabled:
+                self.metrics.count("graph_builds")
+        return self._board_index
 
     def get_agent_by_id(self, agent_id):
-        for agent in self.schedule.agents:
-            if agent.unique_id == agent_id:
-                return agent
-    
\ No newline at end of file
+        return self.agent_store.get(agent_id)
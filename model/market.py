@@ -0,0 +1,211 @@
+import numpy as np
+from constants import COLORS
+from utils import to_vector, to_dict
+from model.tracing import OfferMade
+
+
+def match_color(need, excess):
+    """
+    Greedily match one color's excess to needs, both listed in priority order.
+
+    Needs and excess are laid end to end on one axis (their cumulative sums);
+    every overlap between a giver's interval and a receiver's interval is one
+    transfer, so the result is the same as serving receivers in order from
+    givers in order, computed without a Python loop.
+
+    Returns (giver_positions, receiver_positions, amounts).
+    """
+    if len(need) == 0 or len(excess) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    need_end = np.cumsum(need)
+    excess_end = np.cumsum(excess)
+    total = min(need_end[-1], excess_end[-1])
+    if total <= 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    cuts = np.union1d(need_end, excess_end)
+    cuts = cuts[(cuts > 0) & (cuts < total)]
+    starts = np.concatenate(([0], cuts))
+    amounts = np.concatenate((cuts, [total])) - starts
+    givers = np.searchsorted(excess_end, starts, side='right')
+    receivers = np.searchsorted(need_end, starts, side='right')
+    return givers, receivers, amounts
+
+
+class TokenMarket:
+    """
+    Needs, offers and transfers of every agent as dense (agents x colors) matrices.
+
+    Agents post their needs during the step phase; clear() then matches every
+    agent's offerable tokens against them in one batched call, grouped by the
+    allocation policy of each agent class, and hands the tokens over.
+    """
+
+    def __init__(self, model, agents):
+        self.model = model
+        self.agents = list(agents)
+        # Rows follow the model's agent store, so holdings are its token array
+        self.store = model.agent_store
+        self.row = self.store.row
+        shape = (len(self.agents), len(COLORS))
+        self.needs = np.zeros(shape, dtype=np.int64)
+        self.holdings = np.zeros(shape, dtype=np.int64)
+        self.given = np.zeros(shape, dtype=np.int64)
+        self.received = np.zeros(shape, dtype=np.int64)
+        self.last_trades = (np.zeros(0, dtype=np.int64),) * 4
+        self.trades_made = 0
+
+    def post_needs(self, agent_id, needs):
+        self.needs[self.row[agent_id]] = to_vector(needs)
+
+    def offers_for(self, agent_id):
+        return to_dict(self.received[self.row[agent_id]])
+
+    def reset(self):
+        """Forget this step's needs and offers"""
+        self.needs[:] = 0
+        self.given[:] = 0
+        self.received[:] = 0
+
+    def rows_of(self, agents):
+        return np.array([self.row[agent.unique_id] for agent in agents], dtype=np.int64)
+
+    def offerable(self, agents, method='offerable_tokens'):
+        """Matrix of the tokens each agent is willing to give, from its own policy method"""
+        return np.array([to_vector(getattr(agent, method)()) for agent in agents],
+                        dtype=np.int64).reshape(len(agents), len(COLORS))
+
+    def receivers(self, remaining, priority=None, mask=None):
+        """Rows that still need tokens, highest priority first (ties keep id order)"""
+        wanted = remaining.sum(axis=1) > 0
+        if mask is not None:
+            wanted &= mask
+        rows = np.flatnonzero(wanted)
+        if priority is not None:
+            rows = rows[np.argsort(-priority[rows], kind='stable')]
+        return rows
+
+    def clear(self):
+        """Match offerable tokens to posted needs and transfer them"""
+        self.holdings[:] = self.store.tokens[:len(self.agents)]
+        remaining = self.needs.copy()
+        self.given[:] = 0
+        self.received[:] = 0
+
+        groups = {}
+        for agent in self.agents:
+            groups.setdefault(type(agent).allocation_policy, []).append(agent)
+
+        trades = []
+        for policy, givers in groups.items():
+            giver_rows = self.rows_of(givers)
+            for round_rows, excess, receiver_rows in policy.rounds(self, givers, giver_rows, remaining):
+                excess = np.maximum(excess, 0)
+                for color in range(len(COLORS)):
+                    g, r, amounts = match_color(remaining[receiver_rows, color], excess[:, color])
+                    if len(amounts) == 0:
+                        continue
+                    g_rows, r_rows = round_rows[g], receiver_rows[r]
+                    np.add.at(self.given, (g_rows, color), amounts)
+                    np.add.at(self.received, (r_rows, color), amounts)
+                    np.subtract.at(remaining, (r_rows, color), amounts)
+                    policy.record(self, g_rows, r_rows, amounts)
+                    trades.append((g_rows, r_rows, np.full(len(amounts), color), amounts))
+
+        if trades:
+            self.last_trades = tuple(np.concatenate(column) for column in zip(*trades))
+        else:
+            self.last_trades = (np.zeros(0, dtype=np.int64),) * 4
+        self.trades_made += len(self.last_trades[0])
+        if self.model.metrics.enabled:
+            self.model.metrics.count("offers_made", len(self.last_trades[0]))
+        tracer = self.model.tracer
+        if tracer.debug:
+            step = self.model.schedule.steps
+            for giver, receiver, color, amount in zip(*self.last_trades):
+                tracer.emit(OfferMade(step, self.agents[giver].agent_id, self.agents[receiver].agent_id,
+                                      COLORS[color], int(amount)))
+
+        # Hand the tokens over
+        self.store.tokens[:len(self.agents)] += self.received - self.given
+
+
+class GreedyPolicy:
+    """Offer every excess token, serving receivers in id order (PlayerAgent)"""
+
+    def rounds(self, market, givers, giver_rows, remaining):
+        # Nobody gives away a color it is short of itself
+        excess = np.where(market.needs[giver_rows] > 0, 0, market.offerable(givers))
+        yield giver_rows, excess, market.receivers(remaining)
+
+    def record(self, market, giver_rows, receiver_rows, amounts):
+        pass
+
+
+class StrategicPolicy:
+    """
+    Offer excess tokens to the most promising partners first (StrategicNegotiatorAgent).
+
+    Every giver ranks the receivers itself, one giver after another: a
+    receiver scores higher when its spare tokens cover what the giver needs
+    and when the giver has offered to it before, and lower the more the giver
+    would hand it.
+    """
+
+    def rounds(self, market, givers, giver_rows, remaining):
+        spare = np.where(market.needs > 0, 0, market.holdings)
+        for position, (giver, excess) in enumerate(zip(givers, market.offerable(givers))):
+            row = giver_rows[position]
+            can_receive = np.minimum(spare, market.needs[row]).sum(axis=1)
+            can_give = np.minimum(remaining, excess).sum(axis=1)
+            history = np.zeros(len(market.agents))
+            for other_id, value in giver.trade_history.items():
+                history[market.row[other_id]] = value
+            score = can_receive - 0.7 * can_give + 0.3 * history
+            yield giver_rows[[position]], excess[None], market.receivers(remaining, score)
+
+    def record(self, market, giver_rows, receiver_rows, amounts):
+        for giver_row, receiver_row in zip(giver_rows, receiver_rows):
+            giver = market.agents[giver_row]
+            other_id = market.agents[receiver_row].unique_id
+            giver.trade_history[other_id] = giver.trade_history.get(other_id, 0) + 0.5
+
+
+class CollaborativePolicy:
+    """
+    Offer tokens to agents close to the goal or short of scarce colors (CollaborativePathfinderAgent).
+
+    Only half of the reservable tokens of a scarce color are offered. A second,
+    altruistic round gives agents that are at least 70% of the way to the goal
+    whatever the givers can spare beyond their next few tiles, unless the
+    board index shows no path of colors the receiver could then hold.
+    """
+
+    def rounds(self, market, givers, giver_rows, remaining):
+        analysis = market.model.token_economy.analysis()
+        scarcity = np.array([analysis['scarcity_index'].get(color, 0) for color in COLORS])
+        progress = np.array([analysis['agent_progress'].get(agent.unique_id, 0) for agent in market.agents])
+
+        reservable = market.offerable(givers, 'reservable_tokens')
+        # For scarce tokens, be more conservative
+        reservable = np.where(scarcity > 1.5, reservable // 2, reservable)
+        priority = progress * 5 + remaining @ scarcity
+        yield giver_rows, reservable, market.receivers(remaining, priority)
+
+        spare = market.offerable(givers, 'spare_tokens') - market.given[giver_rows]
+        yield giver_rows, spare, market.receivers(remaining, priority, mask=self.can_finish(market, spare, progress >= 0.7))
+
+    def can_finish(self, market, spare, close):
+        """Which close receivers some path of colors they hold or are offered still takes to the goal"""
+        index = market.model.board_index()
+        offered = {color for color, amount in zip(COLORS, spare.max(axis=0, initial=0)) if amount > 0}
+        usable = (market.holdings + market.received) > 0
+        close = close & (market.needs.sum(axis=1) > 0)
+        for row in np.flatnonzero(close):
+            colors = offered.union(color for color, held in zip(COLORS, usable[row]) if held)
+            close[row] = index.can_reach(market.agents[row].pos, colors)
+        return close
+
+    def record(self, market, giver_rows, receiver_rows, amounts):
+        pass
@@ -0,0 +1,71 @@
+import cProfile
+import threading
+import time
+
+PHASES = ("planning", "trading", "movement", "reset")
+COUNTERS = ("path_searches", "graph_builds", "offers_made", "blocked_moves")
+
+
+class Metrics:
+    """
+    Per-phase timers and event counters of a model, exposed as `model.metrics`.
+
+    Disabled metrics skip the clock entirely and call sites check `enabled`
+    before counting, so the only cost left is a flag test per phase or event.
+    A cProfile hook can be switched on for a chosen range of steps
+    independently of the timers.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.last_step_seconds = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Planners on a thread pool count concurrently
+        self._lock = threading.Lock()
+        self.profiler = None
+        self._profile_range = None
+
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def record_phase(self, phase, started):
+        if self.enabled:
+            elapsed = time.perf_counter() - started
+            self.phase_seconds[phase] += elapsed
+            self.last_step_seconds[phase] = elapsed
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def profile_steps(self, first, last):
+        """Run cProfile over steps first..last (inclusive); results in self.profiler"""
+        self._profile_range = (first, last)
+        self.profiler = cProfile.Profile()
+
+    def step_started(self, step):
+        if self._profile_range is not None and self._profile_range[0] <= step <= self._profile_range[1]:
+            self.profiler.enable()
+
+    def step_finished(self, step):
+        if self._profile_range is not None and self._profile_range[0] <= step <= self._profile_range[1]:
+            self.profiler.disable()
+
+    def snapshot(self):
+        """Flat dict of cumulative phase times and counters"""
+        values = {f"{phase}_seconds": seconds for phase, seconds in self.phase_seconds.items()}
+        values.update(self.counters)
+        return values
+
+    def model_reporters(self):
+        """Mesa DataCollector reporters: last step's phase times and cumulative counters"""
+        reporters = {f"{phase}_seconds": (lambda model, phase=phase: model.metrics.last_step_seconds[phase])
+                     for phase in PHASES}
+        reporters.update({name: (lambda model, name=name: model.metrics.counters[name])
+                          for name in COUNTERS})
+        return reporters
+
+    def data_collector(self):
+        from mesa import DataCollector
+        return DataCollector(model_reporters=self.model_reporters())
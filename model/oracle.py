@@ -0,0 +1,337 @@
+"""
+Exact optimum of a board, to measure how far agent strategies are from it.
+
+A central planner may hand the pooled tokens to whoever it likes. An agent
+reaches the goal along any path whose tiles (the goal included, its start
+excluded) it holds one token each for. The optimum gets the most agents to
+the goal, then spends the fewest tokens doing so.
+
+Every path is summarized by its per-color token counts. For each tile,
+path_frontiers() keeps the Pareto-minimal count vectors of its paths to the
+goal that the pool could pay for. solve() then picks at most one vector per
+agent by branch and bound. Subproblems (next agent, tokens left) are
+memoized, and each branch is bounded by how many of the remaining agents
+could still afford their cheapest path.
+
+Score every board of a corpus against the strategies, from the repository root:
+
+    python -m model.oracle boards.ctc --games 2000
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from constants import COLORS
+from model.bitboard import color_minimums
+from model.board import BoardGraph
+from model.corpus import BoardCorpus
+from model.scenario import AGENT_CLASSES
+
+# Corpora opened by this process, mapped once and shared by all its boards
+_corpora = {}
+
+
+def _prefix_minimums(colors, starts):
+    """(agents, tiles, colors) fewest tokens of each color a path from each start to each tile spends"""
+    # Solved towards each start instead: the same path pays for the start rather than the tile it ends on
+    onehot = np.eye(len(COLORS), dtype=np.int64)[colors]
+    towards = color_minimums(np.broadcast_to(colors, (len(starts),) + colors.shape), np.asarray(starts))
+    leaving = onehot[tuple(np.asarray(starts).T)]
+    return (towards + onehot - leaving[:, None, None]).reshape(len(starts), -1, len(COLORS))
+
+
+def _dominated(tiles, vectors, kept_tiles, kept_vectors, tile_count, chunk=1 << 20):
+    """Which (tile, vector) rows some kept row of the same tile is no larger than in every color"""
+    order = np.argsort(kept_tiles, kind="stable")
+    per_tile = np.bincount(kept_tiles, minlength=tile_count)
+    first = np.cumsum(per_tile) - per_tile
+    counts = per_tile[tiles]
+    ends = np.cumsum(counts)
+    dominated = np.zeros(len(tiles), dtype=bool)
+    # Every candidate against every kept row of its tile, a bounded number of pairs at a time
+    low = 0
+    while low < len(tiles):
+        high = max(low + 1, int(np.searchsorted(ends, ends[low] - counts[low] + chunk, side="right")))
+        c = counts[low:high]
+        rows = np.repeat(np.arange(low, high), c)
+        offsets = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        kept = order[first[tiles[rows]] + offsets]
+        hit = (kept_vectors[kept] <= vectors[rows]).all(axis=1)
+        dominated[rows[hit]] = True
+        low = high
+    return dominated
+
+
+def path_frontiers(colors, goal_pos, pool, starts=None):
+    """
+    pos -> (k, colors) array of the Pareto-minimal token vectors of paths from pos to the goal.
+
+    Vectors are found in order of their total, one BFS layer per extra tile,
+    so a vector can only be dominated by one found in an earlier layer. Any
+    vector the pool can't pay for is dropped, and when starts are given, so
+    is any vector no start could add the cheapest way to its tile to and
+    still pay for. Rows are sorted by total.
+    """
+    colors = np.asarray(colors)
+    width, height = colors.shape
+    tile_count = width * height
+    flat_colors = colors.reshape(-1)
+    pool = np.asarray(pool, dtype=np.int64)
+    budget = int(pool.sum())
+    unit = np.eye(len(COLORS), dtype=np.int64)
+    # Flat index of the up to four neighbors of every tile, -1 off the board
+    xs, ys = np.divmod(np.arange(tile_count), height)
+    neighbors = np.stack([np.where(xs > 0, xs - 1, -1), np.where(xs < width - 1, xs + 1, -1),
+                          np.where(ys > 0, ys - 1, -1), np.where(ys < height - 1, ys + 1, -1)], axis=1)
+    neighbors = np.where(neighbors < 0, -1, np.where(np.arange(4) < 2, neighbors * height + ys[:, None],
+                                                     xs[:, None] * height + neighbors))
+    if starts is not None:
+        prefix = _prefix_minimums(colors, starts)
+        distance = np.array([np.abs(xs - x) + np.abs(ys - y) for x, y in starts])
+    radix = np.cumprod(np.concatenate(([1], pool[:-1] + 1)))
+    span = int(np.prod(pool + 1))
+
+    kept_tiles, kept_vectors = [], []
+    tiles = np.array([goal_pos[0] * height + goal_pos[1]])
+    vectors = np.zeros((1, len(COLORS)), dtype=np.int64)
+    while len(tiles):
+        _, first = np.unique(tiles * span + vectors @ radix, return_index=True)
+        tiles, vectors = tiles[first], vectors[first]
+        if kept_tiles:
+            fresh = ~_dominated(tiles, vectors, np.concatenate(kept_tiles), np.concatenate(kept_vectors),
+                                tile_count)
+            tiles, vectors = tiles[fresh], vectors[fresh]
+        if starts is not None:
+            useful = ((prefix[:, tiles] + vectors[None]) <= pool).all(axis=2)
+            useful &= distance[:, tiles] + vectors.sum(axis=1) <= budget
+            useful = useful.any(axis=0)
+            tiles, vectors = tiles[useful], vectors[useful]
+        if len(tiles) == 0:
+            break
+        kept_tiles.append(tiles)
+        kept_vectors.append(vectors)
+        # A neighbor's path through a tile also pays for the tile itself
+        stepped = vectors + unit[flat_colors[tiles]]
+        affordable = (stepped <= pool).all(axis=1)
+        following = neighbors[tiles[affordable]]
+        on_board = following >= 0
+        tiles = following[on_board]
+        vectors = np.repeat(stepped[affordable], 4, axis=0)[on_board.reshape(-1)]
+
+    if not kept_tiles:
+        return {}
+    tiles, vectors = np.concatenate(kept_tiles), np.concatenate(kept_vectors)
+    order = np.argsort(tiles, kind="stable")
+    tiles, vectors = tiles[order], vectors[order]
+    bounds = np.flatnonzero(np.diff(tiles)) + 1
+    return {divmod(int(group[0]), height): part
+            for group, part in zip(np.split(tiles, bounds), np.split(vectors, bounds))}
+
+
+def trace_path(colors, frontiers, start, vector):
+    """A path from start to the goal spending exactly `vector`, which must be in frontiers[start]"""
+    graph = BoardGraph(*colors.shape)
+    members = {}
+    pos, left, path = start, tuple(int(v) for v in vector), [start]
+    while any(left):
+        for neighbor in graph.neighbors(pos):
+            rest = list(left)
+            rest[colors[neighbor]] -= 1
+            rest = tuple(rest)
+            if min(rest) < 0 or neighbor not in frontiers:
+                continue
+            if neighbor not in members:
+                members[neighbor] = set(map(tuple, frontiers[neighbor].tolist()))
+            if rest in members[neighbor]:
+                pos, left = neighbor, rest
+                path.append(pos)
+                break
+    return path
+
+
+class Optimum:
+    """
+    Best centralized outcome of a board.
+
+    reached lists the indices of the agents sent to the goal, allocation the
+    tokens each of them is given (rows of zeros for the others), paths their
+    routes and spent the tokens all of them use. first_arrival is the fewest
+    steps any agent needs to reach the goal with the whole pool, which is
+    also the shortest game that ends with an agent at the goal.
+    """
+
+    def __init__(self, reached, allocation, paths, first_arrival):
+        self.reached = reached
+        self.allocation = allocation
+        self.paths = paths
+        self.spent = int(allocation.sum())
+        self.first_arrival = first_arrival
+
+    def summary(self):
+        return {"reached": len(self.reached), "agents": self.reached, "spent": self.spent,
+                "first_arrival": self.first_arrival}
+
+
+class _Search:
+    """Branch and bound over agents, each either skipped or given one of its frontier vectors"""
+
+    def __init__(self, options):
+        # Most constrained agents first: fewer choices near the root means a smaller tree
+        self.order = sorted(range(len(options)), key=lambda agent: len(options[agent]))
+        self.options = [options[agent] for agent in self.order]
+        self.totals = [option.sum(axis=1) for option in self.options]
+        self.memo = {}
+
+    def bound(self, depth, remaining):
+        """Optimistic (reached, -spent) of agents from depth on: cheapest affordable paths, within the total"""
+        cheapest = []
+        for options, totals in zip(self.options[depth:], self.totals[depth:]):
+            affordable = np.flatnonzero((options <= remaining).all(axis=1))
+            if len(affordable):
+                cheapest.append(totals[affordable[0]])
+        budget = sum(remaining)
+        reached = spent = 0
+        for total in sorted(cheapest):
+            if spent + total > budget:
+                break
+            reached += 1
+            spent += total
+        return reached, -spent
+
+    def best(self, depth, remaining):
+        """(value, choice) for agents from depth on with `remaining` tokens; choice is an option index or None"""
+        if depth == len(self.options):
+            return (0, 0), None
+        key = (depth, remaining)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+
+        value, choice = (0, 0), None
+        options, totals = self.options[depth], self.totals[depth]
+        pool = np.array(remaining)
+        for index in np.flatnonzero((options <= pool).all(axis=1)):
+            left = tuple((pool - options[index]).tolist())
+            total = int(totals[index])
+            reached, spent = self.bound(depth + 1, left)
+            if (reached + 1, spent - total) <= value:
+                continue
+            (reached, spent), _ = self.best(depth + 1, left)
+            if (reached + 1, spent - total) > value:
+                value, choice = (reached + 1, spent - total), index
+        if self.bound(depth + 1, remaining) > value:
+            skipped, _ = self.best(depth + 1, remaining)
+            if skipped > value:
+                value, choice = skipped, None
+
+        self.memo[key] = value, choice
+        return value, choice
+
+    def solve(self, pool):
+        """Chosen option index (or None) of every agent, in the original agent order"""
+        chosen = [None] * len(self.options)
+        remaining = tuple(int(v) for v in pool)
+        for depth in range(len(self.options)):
+            _, choice = self.best(depth, remaining)
+            chosen[self.order[depth]] = choice
+            if choice is not None:
+                remaining = tuple(int(v) for v in np.array(remaining) - self.options[depth][choice])
+        return chosen
+
+
+def solve(colors, starts, tokens, goal_pos):
+    """Optimum of the board `colors` (width, height) for agents at starts (n, 2) holding tokens (n, colors)"""
+    colors = np.asarray(colors)
+    goal_pos = tuple(int(v) for v in goal_pos)
+    starts = [tuple(int(v) for v in start) for start in starts]
+    pool = np.asarray(tokens, dtype=np.int64).sum(axis=0)
+    frontiers = path_frontiers(colors, goal_pos, pool, starts)
+    empty = np.zeros((0, len(COLORS)), dtype=np.int64)
+    options = [frontiers.get(start, empty) for start in starts]
+
+    cheapest = [int(option.sum(axis=1).min()) for option in options if len(option)]
+    first_arrival = min(cheapest) if cheapest else None
+    chosen = _Search(options).solve(pool)
+
+    allocation = np.zeros((len(starts), len(COLORS)), dtype=np.int64)
+    paths = {}
+    for agent, choice in enumerate(chosen):
+        if choice is not None:
+            allocation[agent] = options[agent][choice]
+            paths[agent] = trace_path(colors, frontiers, starts[agent], allocation[agent])
+    reached = [agent for agent, choice in enumerate(chosen) if choice is not None]
+    return Optimum(reached, allocation, paths, first_arrival)
+
+
+def solve_record(path, index):
+    """Summary of the optimum of one corpus record"""
+    corpus = _corpora.get(path)
+    if corpus is None:
+        corpus = _corpora[path] = BoardCorpus(path)
+    record = corpus.records[index]
+    summary = solve(record["colors"], record["starts"], record["tokens"], record["goal"]).summary()
+    summary["record"] = index
+    return summary
+
+
+def solve_corpus(path, games=None, workers=None):
+    """Optimum summaries of the first `games` records (all by default), in record order"""
+    games = len(BoardCorpus(path)) if games is None else games
+    chunksize = max(1, games // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(solve_record, [path] * games, range(games), chunksize=chunksize))
+
+
+def optimality_gaps(optima, results):
+    """
+    Compare one strategy's game results with the optima of the same boards.
+
+    A game ends as soon as any agent reaches the goal, so a strategy is
+    optimal when it gets someone there on every solvable board (where the
+    pooled tokens can take anyone to the goal) in first_arrival steps.
+    goal_gap is the share of boards where it could have and didn't, and
+    extra_steps how much longer the games it won took than the shortest
+    possible. optimal_mean_reached is the centralized bound on how many
+    agents could reach the goal together; it also counts agents the game
+    rules never let finish, so it is only comparable to mean_reached as an
+    upper bound.
+    """
+    boards = len(optima)
+    solvable = [(optimum, result) for optimum, result in zip(optima, results) if optimum["reached"]]
+    solved = [(optimum, result) for optimum, result in solvable if result["reached_goal"]]
+    return {
+        "boards": boards,
+        "solvable_rate": len(solvable) / boards if boards else 0.0,
+        "solved_rate": len(solved) / len(solvable) if solvable else 0.0,
+        "goal_gap": (len(solvable) - len(solved)) / boards if boards else 0.0,
+        "mean_extra_steps": sum(result["steps"] - optimum["first_arrival"]
+                                for optimum, result in solved) / len(solved) if solved else 0.0,
+        "optimal_mean_reached": sum(optimum["reached"] for optimum in optima) / boards if boards else 0.0,
+        "mean_reached": sum(len(result["reached_goal"]) for result in results) / boards if boards else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from batch import run_corpus_batch
+
+    parser = argparse.ArgumentParser(description="Score agent strategies against the optimum of every corpus board")
+    parser.add_argument("corpus")
+    parser.add_argument("--games", type=int, default=None, help="default: the whole corpus")
+    parser.add_argument("--agent-class", choices=sorted(AGENT_CLASSES), action="append",
+                        help="strategies to score (repeatable, default all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=100)
+    parser.add_argument("--output", help="write one JSON line per board optimum to this file")
+    args = parser.parse_args()
+
+    optima = solve_corpus(args.corpus, args.games, args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            for optimum in optima:
+                f.write(json.dumps(optimum) + "\n")
+    report = {}
+    for agent_name in args.agent_class or AGENT_CLASSES:
+        results = run_corpus_batch(args.corpus, agent_name, len(optima), args.workers, args.max_steps)
+        report[agent_name] = optimality_gaps(optima, results)
+    print(json.dumps(report, indent=2))
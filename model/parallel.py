@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from constants import COLORS
+from model.bitboard import BoardIndex
+from model.board import BoardGraph, ColorBoard, ColorRequirementField
+from model.metrics import Metrics
+from model.path_cache import PathCache
+
+
+class PlanningBoard:
+    """
+    Read-only copy of a model's board for planning worker processes.
+
+    Exposes the attributes planners read from the model (board graph, tile
+    colors, goal and the color requirement fields), built once per worker.
+    """
+
+    def __init__(self, width, height, colors, goal_pos):
+        self.board_graph = BoardGraph(width, height)
+        self.board_graph.goal_field(goal_pos)
+        self.tile_colors = ColorBoard(colors)
+        self.goal_pos = goal_pos
+        # Worker-side counts never reach the model, so they stay off
+        self.metrics = Metrics()
+        self.path_cache = PathCache()
+        self._color_requirements = {}
+        self._board_index = None
+
+    def color_requirement_field(self, goal_pos):
+        key = (goal_pos, self.tile_colors.version)
+        field = self._color_requirements.get(key)
+        if field is None:
+            field = ColorRequirementField(self.board_graph, self.tile_colors, goal_pos, COLORS)
+            self._color_requirements[key] = field
+        return field
+
+    def board_index(self):
+        # Color bitsets and their transforms, rebuilt when the board changes
+        if self._board_index is None or self._board_index.version != self.tile_colors.version:
+            self._board_index = BoardIndex(self.tile_colors, self.goal_pos)
+        return self._board_index
+
+
+_worker_board = None
+
+
+def _init_worker(width, height, colors, goal_pos):
+    global _worker_board
+    _worker_board = PlanningBoard(width, height, colors, goal_pos)
+
+
+def _run_task(function, args):
+    return function(_worker_board, *args)
+
+
+class ParallelPlanning:
+    """
+    Runs the planning phase of a step on worker pools instead of one agent after another.
+
+    Planning only reads shared state, so every agent's plan() can run at the
+    same time. Agents that offer a plan_task() (the expensive multi-path
+    planners) go to a process pool whose workers each hold a read-only board;
+    the rest run on a thread pool. Plans are applied in schedule order on the
+    calling thread, so needs are broadcast, traced and traded exactly as in a
+    serial step, whatever the number of workers.
+
+    Every agent plans against the start-of-step state. In a serial step,
+    collaborative agents also see the needs broadcast by agents before them,
+    so their paths can differ between the two modes.
+    """
+
+    def __init__(self, workers=None, processes=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self._threads = None
+        self._pool = None
+        self._pool_model = None
+
+    def thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers)
+        return self._threads
+
+    def process_pool(self, model):
+        # Workers copy the board once when they start, so a new model or a recolored board needs new workers
+        key = (model, model.tile_colors.version)
+        if self._pool_model != key:
+            if self._pool is not None:
+                self._pool.shutdown()
+            board = model.tile_colors
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(board.width, board.height, board.colors,
+                                                       model.goal_pos))
+            self._pool_model = key
+        return self._pool
+
+    def run(self, model, agents):
+        # Scarcity is refreshed lazily on first read; do it once here, not racing in every thread
+        model.token_economy.analysis()
+        futures = []
+        for agent in agents:
+            task = agent.plan_task() if self.processes and hasattr(agent, "plan_task") else None
+            if task is not None:
+                function, args = task
+                futures.append(self.process_pool(model).submit(_run_task, function, args))
+            else:
+                futures.append(self.thread_pool().submit(agent.plan))
+        # Applying broadcasts needs, which planners still running would read
+        plans = [future.result() for future in futures]
+        for agent, plan in zip(agents, plans):
+            agent.apply_plan(plan)
+
+    def close(self):
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_model = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class PathCache:
+    """
+    Bounded memo of path evaluations, evicting the least recently used entry.
+
+    Keys are built by the callers from the start position, the token
+    inventory as a tuple, the goal and the board version (plus whatever else
+    the evaluation depends on, e.g. color weights), so a changed board or
+    weight simply stops matching the old entries, which then age out.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Planning threads share the cache; compute() itself runs unlocked
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, or compute() stored under it"""
+        entries = self._entries
+        with self._lock:
+            if key in entries:
+                self.hits += 1
+                entries.move_to_end(key)
+                return entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            entries[key] = value
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def info(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
@@ -0,0 +1,89 @@
+import numpy as np
+from constants import COLORS
+from model.board import ColorBoard
+from agents.player_agent import PlayerAgent
+from agents.strategic_negotiator_agent import StrategicNegotiatorAgent
+from agents.collaborative_pathfinder_agent import CollaborativePathfinderAgent
+
+AGENT_CLASSES = {
+    "player": PlayerAgent,
+    "strategic": StrategicNegotiatorAgent,
+    "collaborative": CollaborativePathfinderAgent,
+}
+
+
+class Scenario:
+    """
+    Parameters of a game, from which the board and the agents are generated on demand.
+
+    Only the parameters and the seed are stored; board() draws the whole
+    color array in one vectorized call and agents_infos() draws every start
+    position, endowment and class at once, so even very large scenarios are
+    cheap to build, pickle and regenerate identically in another process.
+
+    agent_mix maps agent class names (see AGENT_CLASSES) to their share of the
+    agents, color_weights maps colors to their share of the tiles (uniform by
+    default) and every agent gets a uniform number of tokens of each color in
+    the inclusive token_range. Agents never start on the goal.
+    """
+
+    def __init__(self, width=7, height=5, n_agents=3, agent_mix=None, color_weights=None,
+                 token_range=(0, 2), goal_pos=None, seed=None):
+        self.width = width
+        self.height = height
+        self.n_agents = n_agents
+        self.agent_mix = agent_mix if agent_mix is not None else {"player": 1}
+        self.color_weights = color_weights
+        self.token_range = token_range
+        self.goal_pos = goal_pos if goal_pos is not None else (width - 1, height - 1)
+        self.seed = seed
+
+    def _rngs(self):
+        # Separate streams, so changing the agents never changes the board
+        board_seed, agents_seed = np.random.SeedSequence(self.seed).spawn(2)
+        return np.random.default_rng(board_seed), np.random.default_rng(agents_seed)
+
+    def board(self):
+        rng, _ = self._rngs()
+        weights = None
+        if self.color_weights is not None:
+            weights = np.array([self.color_weights.get(color, 0) for color in COLORS], dtype=float)
+            weights /= weights.sum()
+        colors = rng.choice(len(COLORS), size=(self.width, self.height), p=weights)
+        return ColorBoard(colors.astype(np.uint8))
+
+    def agent_arrays(self):
+        """Start tiles as (agents, 2), token counts as (agents, colors) and indices into agent_mix"""
+        _, rng = self._rngs()
+        n = self.n_agents
+
+        # Any tile but the goal: draw among the other tiles and skip over the goal's index
+        goal_index = self.goal_pos[0] * self.height + self.goal_pos[1]
+        tiles = rng.integers(0, self.width * self.height - 1, size=n)
+        tiles += tiles >= goal_index
+        xs, ys = np.divmod(tiles, self.height)
+
+        low, high = self.token_range
+        tokens = rng.integers(low, high + 1, size=(n, len(COLORS)))
+
+        names = list(self.agent_mix)
+        shares = np.array([self.agent_mix[name] for name in names], dtype=float)
+        kinds = rng.choice(len(names), size=n, p=shares / shares.sum())
+        return np.stack((xs, ys), axis=1), tokens, kinds
+
+    def agents_infos(self):
+        """agent_id -> {"pos", "tokens", "class"}, in the format ColoredTrailsModel takes"""
+        starts, tokens, kinds = self.agent_arrays()
+        classes = [AGENT_CLASSES[name] for name in self.agent_mix]
+        return agents_infos_from_arrays(starts, tokens, [classes[kind] for kind in kinds])
+
+
+def agents_infos_from_arrays(starts, tokens, classes):
+    return {
+        agent_id: {
+            "pos": (int(starts[agent_id, 0]), int(starts[agent_id, 1])),
+            "tokens": {COLORS[c]: int(amount) for c, amount in enumerate(tokens[agent_id]) if amount},
+            "class": classes[agent_id],
+        }
+        for agent_id in range(len(starts))
+    }
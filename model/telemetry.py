@@ -0,0 +1,108 @@
+import glob
+import os
+import numpy as np
+from constants import COLORS
+
+
+def _columns(capacity):
+    colors = len(COLORS)
+    return {
+        "step": np.zeros(capacity, dtype=np.int32),
+        "agent_id": np.zeros(capacity, dtype=np.int64),
+        "x": np.zeros(capacity, dtype=np.int32),
+        "y": np.zeros(capacity, dtype=np.int32),
+        "tokens": np.zeros((capacity, colors), dtype=np.int32),
+        "needs": np.zeros((capacity, colors), dtype=np.int32),
+        "given": np.zeros((capacity, colors), dtype=np.int32),
+        "received": np.zeros((capacity, colors), dtype=np.int32),
+        "blocked": np.zeros(capacity, dtype=bool),
+        "goal_reached": np.zeros(capacity, dtype=bool),
+        "path_length": np.zeros(capacity, dtype=np.int32),
+    }
+
+
+class TelemetryWriter:
+    """
+    Streams one row per agent per step into column buffers, flushed as NPZ chunks.
+
+    The buffers are allocated once with room for chunk_rows rows; whenever
+    they fill up they are written to directory/chunk_NNNNN.npz and reused, so
+    memory stays bounded however long the game runs. Rows are taken from the
+    agent store and the market matrices right after the movement phase, when
+    the step's needs, transfers and moves are all known. Load the result with
+    load_telemetry().
+    """
+
+    def __init__(self, directory, chunk_rows=65536):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.columns = _columns(chunk_rows)
+        self.size = 0
+        self.chunks = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def record_step(self, model):
+        store = model.agent_store
+        market = model.market
+        rows = store.active()
+        agents = store.agents
+        step_columns = {
+            "step": model.schedule.steps,
+            # agents_infos keys, as game outcomes number agents
+            "agent_id": [agent.agent_id for agent in agents],
+            "x": store.x[rows],
+            "y": store.y[rows],
+            "tokens": store.tokens[rows],
+            "needs": market.needs,
+            "given": market.given,
+            "received": market.received,
+            # A move resets blocked_steps, so a positive count means this step's move failed
+            "blocked": store.blocked_steps[rows] > 0,
+            "goal_reached": store.goal_reached[rows],
+            "path_length": [len(getattr(agent, "path_to_goal", ())) for agent in agents],
+        }
+        self.append(step_columns, len(agents))
+
+    def append(self, step_columns, count):
+        """Copy `count` rows into the buffers, flushing every time they fill up"""
+        done = 0
+        while done < count:
+            take = min(count - done, self.chunk_rows - self.size)
+            for name, buffer in self.columns.items():
+                values = step_columns[name]
+                if np.ndim(values) == 0:
+                    buffer[self.size:self.size + take] = values
+                else:
+                    buffer[self.size:self.size + take] = np.asarray(values)[done:done + take]
+            self.size += take
+            done += take
+            if self.size == self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+        path = os.path.join(self.directory, f"chunk_{self.chunks:05d}.npz")
+        with open(path, "wb") as f:
+            np.savez(f, **{name: buffer[:self.size] for name, buffer in self.columns.items()})
+        self.chunks += 1
+        self.size = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_telemetry(directory, columns=None):
+    """All chunks of a telemetry directory as one array per column (only the given columns)"""
+    parts = {}
+    for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+        with np.load(path) as chunk:
+            for name in columns or chunk.files:
+                parts.setdefault(name, []).append(chunk[name])
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+
+class TokenEconomy:
+    """
+    Shared snapshot of the token economy, owned by the model.
+
+    Totals, needs, positions and progress are updated incrementally as needs are
+    broadcast, tokens change hands and agents move, so reading the analysis costs
+    O(colors) instead of a scan over every agent and every broadcast need.
+    """
+
+    def __init__(self, goal_pos):
+        self.goal_pos = goal_pos
+        self.total_available = defaultdict(int)
+        self.total_needed = defaultdict(int)
+        self.scarcity_index = defaultdict(float)
+        self.agent_positions = {}
+        self.agent_progress = {}
+        self._start_distance = {}
+        self._needs_by_agent = {}
+        self._scarcity_dirty = True
+
+    def _distance_to_goal(self, pos):
+        return abs(pos[0] - self.goal_pos[0]) + abs(pos[1] - self.goal_pos[1])
+
+    def register_agent(self, agent_id, pos, tokens):
+        self._start_distance[agent_id] = self._distance_to_goal(pos)
+        self.record_position(agent_id, pos)
+        for color, amount in tokens.items():
+            self.adjust_tokens(color, amount)
+
+    def record_position(self, agent_id, pos):
+        # Approximate progress to goal (as percentage of manhattan distance)
+        self.agent_positions[agent_id] = pos
+        start_dist = self._start_distance[agent_id]
+        if start_dist > 0:
+            current_dist = self._distance_to_goal(pos)
+            self.agent_progress[agent_id] = max(0, (start_dist - current_dist) / start_dist)
+        else:
+            self.agent_progress[agent_id] = 1.0
+
+    def adjust_tokens(self, color, delta):
+        """Account for tokens entering (delta > 0) or leaving agents' hands"""
+        if delta:
+            self.total_available[color] += delta
+            self._scarcity_dirty = True
+
+    def record_needs(self, agent_id, needs):
+        # A new broadcast replaces whatever the agent asked for earlier this step
+        for color, amount in self._needs_by_agent.get(agent_id, {}).items():
+            self.total_needed[color] -= amount
+        for color, amount in needs.items():
+            self.total_needed[color] += amount
+        self._needs_by_agent[agent_id] = dict(needs)
+        self._scarcity_dirty = True
+
+    def clear_needs(self):
+        self.total_needed.clear()
+        self._needs_by_agent.clear()
+        self._scarcity_dirty = True
+
+    def _update_scarcity(self):
+        # Calculate scarcity index (higher means more scarce)
+        self.scarcity_index.clear()
+        for color in set(self.total_available) | set(self.total_needed):
+            available = self.total_available.get(color, 0)
+            needed = self.total_needed.get(color, 0)
+
+            if needed == 0:
+                self.scarcity_index[color] = 0
+            elif available == 0:
+                self.scarcity_index[color] = 10  # Very scarce
+            else:
+                self.scarcity_index[color] = needed / available
+        self._scarcity_dirty = False
+
+    def analysis(self):
+        """Current snapshot, shared by every reader; treat it as read-only"""
+        if self._scarcity_dirty:
+            self._update_scarcity()
+        return {
+            'total_available': self.total_available,
+            'total_needed': self.total_needed,
+            'scarcity_index': self.scarcity_index,
+            'agent_positions': self.agent_positions,
+            'agent_progress': self.agent_progress
+        }
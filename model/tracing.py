@@ -0,0 +1,80 @@
+import json
+from collections import deque, namedtuple
+
+# Trace levels: DEBUG records every planning, trading and movement event,
+# INFO only the outcomes (blocks, goals and deadlocks)
+DEBUG = 10
+INFO = 20
+
+PathChosen = namedtuple("PathChosen", "step agent_id path")
+NeedBroadcast = namedtuple("NeedBroadcast", "step agent_id needs")
+OfferMade = namedtuple("OfferMade", "step giver_id receiver_id color amount")
+Move = namedtuple("Move", "step agent_id from_pos to_pos color")
+Blocked = namedtuple("Blocked", "step agent_id pos color")
+GoalReached = namedtuple("GoalReached", "step agent_id pos")
+Deadlock = namedtuple("Deadlock", "step pool")
+
+
+class Tracer:
+    """
+    Level-gated recorder of typed game events into a bounded ring buffer.
+
+    Call sites check the `debug` / `info` flags before building an event, so a
+    disabled tracer costs one attribute lookup and no formatting at all.
+    """
+
+    def __init__(self, level=None, capacity=10000, sink=None):
+        self.level = level
+        self.debug = level is not None and level <= DEBUG
+        self.info = level is not None and level <= INFO
+        self.events = deque(maxlen=capacity)
+        self.sink = sink
+
+    def emit(self, event):
+        self.events.append(event)
+        if self.sink is not None:
+            self.sink.write(event)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+def event_record(event):
+    record = {"event": type(event).__name__}
+    record.update(event._asdict())
+    return record
+
+
+class JsonlSink:
+    """Buffered JSON-lines sink; events are only serialized when the buffer is flushed"""
+
+    def __init__(self, path, flush_every=1000):
+        self.file = open(path, "w")
+        self.flush_every = flush_every
+        self._buffer = []
+
+    def write(self, event):
+        self._buffer.append(event)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.file.write("".join(json.dumps(event_record(event)) + "\n" for event in self._buffer))
+            self._buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class ConsoleSink:
+    """Prints every event as it happens, for interactive runs"""
+
+    def write(self, event):
+        print(f"[*] {event}")
+
+    def close(self):
+        pass
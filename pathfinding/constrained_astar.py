@@ -0,0 +1,122 @@
+import heapq
+from itertools import count
+from constants import COLORS
+
+
+class _Label:
+    """One search state: a position reached with a given token inventory"""
+    __slots__ = ("pos", "tokens", "deficit", "deficit_total", "g", "parent", "alive", "key")
+
+    def __init__(self, pos, tokens, deficit, g, parent):
+        self.pos = pos
+        self.tokens = tokens
+        self.deficit = deficit
+        self.deficit_total = sum(deficit)
+        self.g = g
+        self.parent = parent
+        self.alive = True
+        self.key = None
+
+    def dominates(self, other):
+        # Every token the other state holds beyond ours can save it at most one
+        # unit of deficit later on, so we are never worse if that still leaves us ahead
+        if self.g > other.g:
+            return False
+        shortfall = sum(b - a for a, b in zip(self.tokens, other.tokens) if b > a)
+        return self.deficit_total + shortfall <= other.deficit_total
+
+    def path(self):
+        path = []
+        label = self
+        while label is not None:
+            path.append(label.pos)
+            label = label.parent
+        path.reverse()
+        return path
+
+
+def manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def deficit_lower_bound(pos, tokens, goal_pos, requirements):
+    # Each color needs at least its minimum count along any path, and every step needs some token
+    bound = manhattan(pos, goal_pos) - sum(tokens)
+    if requirements is not None:
+        minimum = requirements.at(pos)
+        bound = max(bound, sum(need - have for need, have in zip(minimum, tokens) if need > have))
+    return max(0, bound)
+
+
+def constrained_astar(start_pos, goal_pos, tokens, board_graph, tile_colors, requirements=None, max_labels=16):
+    """
+    A* over (position, token inventory) states.
+
+    Entering a tile consumes one token of its color; entering it without such a
+    token is allowed but adds one to the deficit of that color. States are ranked
+    by (total deficit, steps + manhattan distance) lower bounds, deeper states
+    first on ties, so the first goal state popped is the shortest affordable path
+    if one exists, otherwise the path with the smallest deficit. States dominated
+    by another state on the same tile (no fewer steps and no lower deficit once
+    token differences are accounted for) are pruned.
+
+    When a ColorRequirementField for goal_pos is given, its per-color minimums
+    give an admissible lower bound on the deficit still to come, which keeps the
+    search focused when no affordable path exists.
+
+    At most max_labels states are kept per tile, the most promising ones. The
+    game's boards rarely reach the limit and get the exact answer; on large
+    boards with big inventories it turns the search into a beam search instead
+    of letting the number of incomparable inventories explode.
+
+    Returns (path, deficit) where deficit maps colors to missing token counts.
+    """
+    color_index = {color: i for i, color in enumerate(COLORS)}
+    start = _Label(start_pos, tuple(tokens.get(color, 0) for color in COLORS),
+                   (0,) * len(COLORS), 0, None)
+    start.key = (deficit_lower_bound(start_pos, start.tokens, goal_pos, requirements),
+                 manhattan(start_pos, goal_pos))
+    labels = {start_pos: [start]}
+    tie = count()
+    heap = [(*start.key, 0, next(tie), start)]
+
+    while heap:
+        *_, label = heapq.heappop(heap)
+        if not label.alive:
+            continue
+        if label.pos == goal_pos:
+            deficit = {color: label.deficit[i] for i, color in enumerate(COLORS) if label.deficit[i] > 0}
+            return label.path(), deficit
+
+        for neighbor in board_graph.neighbors(label.pos):
+            i = color_index[tile_colors[neighbor]]
+            if label.tokens[i] > 0:
+                new_tokens = label.tokens[:i] + (label.tokens[i] - 1,) + label.tokens[i + 1:]
+                new_deficit = label.deficit
+            else:
+                new_tokens = label.tokens
+                new_deficit = label.deficit[:i] + (label.deficit[i] + 1,) + label.deficit[i + 1:]
+            candidate = _Label(neighbor, new_tokens, new_deficit, label.g + 1, label)
+
+            # Dominance pruning against every live state on this tile
+            existing = labels.setdefault(neighbor, [])
+            if any(other.dominates(candidate) for other in existing):
+                continue
+            for other in existing:
+                if candidate.dominates(other):
+                    other.alive = False
+            existing[:] = [other for other in existing if other.alive]
+
+            f_deficit = candidate.deficit_total + deficit_lower_bound(neighbor, new_tokens, goal_pos, requirements)
+            f_steps = candidate.g + manhattan(neighbor, goal_pos)
+            candidate.key = (f_deficit, f_steps)
+            if max_labels is not None and len(existing) >= max_labels:
+                worst = max(existing, key=lambda other: other.key)
+                if worst.key <= candidate.key:
+                    continue
+                worst.alive = False
+                existing.remove(worst)
+            existing.append(candidate)
+            heapq.heappush(heap, (f_deficit, f_steps, -candidate.g, next(tie), candidate))
+
+    raise ValueError(f"{start_pos} cannot reach goal {goal_pos}")
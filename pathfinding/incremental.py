@@ -0,0 +1,175 @@
+import heapq
+
+INFINITY = float('inf')
+
+
+def _manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+class IncrementalPlanner:
+    """
+    D* Lite planner towards a fixed goal where entering a tile costs the weight of its color.
+
+    The search runs backwards from the goal and keeps its g/rhs values between
+    calls. When color weights change, only the tiles next to tiles of those
+    colors are re-examined, and moving the start only shifts the key modifier,
+    so each replan repairs the previous search instead of starting from zero.
+    Every weight must be at least 1, which keeps the manhattan heuristic admissible.
+
+    Repairing is only cheaper while few tiles are affected. The first plan, any
+    plan changing the weight of colors that cover more than repair_limit of
+    the board, and any repair that has expanded that many tiles without
+    finishing restart instead with a plain backward Dijkstra over the whole
+    board, whose distances are a consistent D* Lite state that later repairs
+    continue from. The tiles of each color come from the model's shared board
+    index rather than a per-planner copy.
+    """
+
+    def __init__(self, board_graph, tile_colors, goal_pos, weights, board_index, repair_limit=0.05):
+        self.board_graph = board_graph
+        self.tile_colors = tile_colors
+        self.board_index = board_index
+        self.goal_pos = goal_pos
+        self.weights = dict(weights)
+        self.repair_limit = repair_limit
+
+        self.start_pos = None
+        self.km = 0
+        self.g = {}
+        self.rhs = {goal_pos: 0}
+        self._queue = []
+        self._queued = {}
+
+    def __getstate__(self):
+        # The board belongs to the model; attach() puts it back after unpickling
+        state = self.__dict__.copy()
+        del state["board_graph"], state["tile_colors"], state["board_index"]
+        return state
+
+    def attach(self, board_graph, tile_colors, board_index):
+        self.board_graph = board_graph
+        self.tile_colors = tile_colors
+        self.board_index = board_index
+
+    def plan(self, start_pos, weights):
+        """Repair the search for a new start and color weights, then return the path"""
+        limit = self.repair_limit * self.board_index.grid.size
+        changed = [color for color, weight in weights.items() if self.weights.get(color) != weight]
+        if self.start_pos is None or sum(len(self.board_index.positions(color)) for color in changed) > limit:
+            self._restart(start_pos, weights)
+            return self._extract_path()
+
+        if start_pos != self.start_pos:
+            self.km += _manhattan(self.start_pos, start_pos)
+            self.start_pos = start_pos
+        self.weights.update(weights)
+        for color in changed:
+            for tile in self.board_index.positions(color):
+                # The edges entering this tile changed, so its neighbors' rhs may too
+                for neighbor in self.board_graph.neighbors(tile):
+                    self._update_vertex(neighbor)
+
+        if not self._compute_shortest_path(limit):
+            self._restart(start_pos, weights)
+        return self._extract_path()
+
+    def _restart(self, start_pos, weights):
+        """Search from scratch: exact distances to the goal for every tile, nothing left to repair"""
+        self.start_pos = start_pos
+        self.weights = dict(weights)
+        self.km = 0
+        self.g = {self.goal_pos: 0}
+        heap = [(0, self.goal_pos)]
+        while heap:
+            distance, pos = heapq.heappop(heap)
+            if distance > self.g[pos]:
+                continue
+            # A neighbor reaches the goal through pos by entering it
+            entered = self._cost(pos) + distance
+            for neighbor in self.board_graph.neighbors(pos):
+                if entered < self.g.get(neighbor, INFINITY):
+                    self.g[neighbor] = entered
+                    heapq.heappush(heap, (entered, neighbor))
+        self.rhs = dict(self.g)
+        self._queue = []
+        self._queued = {}
+
+    def _g(self, pos):
+        return self.g.get(pos, INFINITY)
+
+    def _rhs(self, pos):
+        return self.rhs.get(pos, INFINITY)
+
+    def _cost(self, pos):
+        return self.weights[self.tile_colors[pos]]
+
+    def _key(self, pos):
+        best = min(self._g(pos), self._rhs(pos))
+        start = self.start_pos if self.start_pos is not None else pos
+        return (best + _manhattan(start, pos) + self.km, best)
+
+    def _push(self, pos):
+        key = self._key(pos)
+        self._queued[pos] = key
+        heapq.heappush(self._queue, (key, pos))
+        if len(self._queue) > 4 * len(self._queued) + 64:
+            # Mostly stale entries: rebuild the heap from the current keys only
+            self._queue = [(key, pos) for pos, key in self._queued.items()]
+            heapq.heapify(self._queue)
+
+    def _top_key(self):
+        # Entries are invalidated lazily: drop the ones no longer current
+        while self._queue:
+            key, pos = self._queue[0]
+            if self._queued.get(pos) == key:
+                return key
+            heapq.heappop(self._queue)
+        return (INFINITY, INFINITY)
+
+    def _update_vertex(self, pos):
+        if pos != self.goal_pos:
+            self.rhs[pos] = min(self._cost(neighbor) + self._g(neighbor)
+                                for neighbor in self.board_graph.neighbors(pos))
+        if self._g(pos) != self._rhs(pos):
+            self._push(pos)
+        else:
+            self._queued.pop(pos, None)
+
+    def _compute_shortest_path(self, limit=INFINITY):
+        """Expand tiles until the start is consistent; False if that takes more than limit expansions"""
+        start = self.start_pos
+        expanded = 0
+        while True:
+            top_key = self._top_key()
+            if top_key == (INFINITY, INFINITY):
+                return True
+            if not (top_key < self._key(start) or self._rhs(start) != self._g(start)):
+                return True
+            expanded += 1
+            if expanded > limit:
+                return False
+            old_key, pos = heapq.heappop(self._queue)
+            new_key = self._key(pos)
+            if old_key < new_key:
+                self._push(pos)
+                continue
+            del self._queued[pos]
+            if self._g(pos) > self._rhs(pos):
+                self.g[pos] = self._rhs(pos)
+            else:
+                self.g[pos] = INFINITY
+                self._update_vertex(pos)
+            for neighbor in self.board_graph.neighbors(pos):
+                self._update_vertex(neighbor)
+
+    def _extract_path(self):
+        pos = self.start_pos
+        if self._g(pos) == INFINITY:
+            return [pos] if pos == self.goal_pos else []
+        path = [pos]
+        while pos != self.goal_pos:
+            pos = min(self.board_graph.neighbors(pos),
+                      key=lambda neighbor: self._cost(neighbor) + self._g(neighbor))
+            path.append(pos)
+        return path
@@ -0,0 +1,94 @@
+import heapq
+from itertools import count
+
+
+def unit_cost(node):
+    return 1
+
+
+def _manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def _astar(board_graph, source, target, node_cost, heuristic, blocked_nodes, blocked_edges):
+    """Cheapest path from source to target avoiding the blocked nodes and directed edges"""
+    tie = count()
+    dist = {source: 0}
+    previous = {source: None}
+    heap = [(heuristic(source), 0, next(tie), source)]
+    while heap:
+        _, neg_dist, _, node = heapq.heappop(heap)
+        d = -neg_dist
+        if node == target:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = previous[node]
+            path.reverse()
+            return path, d
+        if d > dist[node]:
+            continue
+        for neighbor in board_graph.neighbors(node):
+            if neighbor in blocked_nodes or (node, neighbor) in blocked_edges:
+                continue
+            new_dist = d + node_cost(neighbor)
+            if new_dist < dist.get(neighbor, float('inf')):
+                dist[neighbor] = new_dist
+                previous[neighbor] = node
+                estimate = new_dist + heuristic(neighbor)
+                heapq.heappush(heap, (estimate, -new_dist, next(tie), neighbor))
+    return None, float('inf')
+
+
+def shortest_simple_paths(board_graph, source, target, node_cost=unit_cost, min_node_cost=1, heuristic=None):
+    """
+    Lazily yield loopless paths from source to target by nondecreasing cost (Yen's algorithm).
+
+    The cost of a path is the sum of node_cost over every tile entered after the
+    source, so a color-based cost such as `lambda pos: weights[tile_colors[pos]]`
+    can be plugged in. min_node_cost must not exceed any node cost; it scales the
+    manhattan heuristic of the A* spur searches (0 falls back to Dijkstra).
+    A sharper heuristic, a consistent lower bound of the cost from a node to
+    the target, can be given instead.
+
+    The shared board graph is never copied or modified: removed nodes and edges
+    only live in the per-spur blocked sets.
+    """
+    if heuristic is None:
+        heuristic = lambda node: min_node_cost * _manhattan(node, target)
+    first, _ = _astar(board_graph, source, target, node_cost, heuristic, set(), set())
+    if first is None:
+        return
+
+    accepted = [first]
+    seen = {tuple(first)}
+    candidates = []
+    tie = count()
+    yield first
+
+    while True:
+        last = accepted[-1]
+        root_cost = 0
+        for i in range(len(last) - 1):
+            spur_node = last[i]
+            root = last[:i + 1]
+
+            # Forbid the next edge of every accepted path sharing this root
+            blocked_edges = {(path[i], path[i + 1]) for path in accepted
+                             if len(path) > i + 1 and path[:i + 1] == root}
+            blocked_nodes = set(root[:-1])
+            spur_path, spur_cost = _astar(board_graph, spur_node, target, node_cost, heuristic,
+                                          blocked_nodes, blocked_edges)
+            if spur_path is not None:
+                total_path = root[:-1] + spur_path
+                key = tuple(total_path)
+                if key not in seen:
+                    seen.add(key)
+                    heapq.heappush(candidates, (root_cost + spur_cost, next(tie), total_path))
+            root_cost += node_cost(last[i + 1])
+
+        if not candidates:
+            return
+        _, _, path = heapq.heappop(candidates)
+        accepted.append(path)
+        yield path
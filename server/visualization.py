@@ -0,0 +1,494 @@
+"""
+Local browser view of a running game, streaming per-step diffs.
+
+Run from the repository root, then open http://127.0.0.1:8521/ :
+
+    python -m server.visualization --width 500 --height 500 --agents 5000
+
+The model runs at full speed in its own thread. At most `fps` times a second
+a frame (positions, inventories, goal flags and the offers received and
+given since the previous frame) is copied out of the agent store. Every
+browser connection keeps what it was last sent and only gets the agents
+inside its viewport that moved, changed inventory or traded. When the view
+is panned or zoomed the browser reconnects with the new viewport and gets
+that region's tiles and agents once. The grid is never sent again unless a
+tile is recolored. A slow browser just skips frames; the model never waits
+for it.
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from constants import COLORS
+from model.game_model import ColoredTrailsModel
+from model.scenario import Scenario, AGENT_CLASSES
+
+
+class Frame:
+    """State of the game between two steps, as copies safe to read from other threads"""
+
+    def __init__(self, index, model, received, given, board):
+        store = model.agent_store
+        rows = store.active()
+        self.index = index
+        self.step = model.schedule.steps
+        self.running = model.running
+        self.x = store.x[rows].copy()
+        self.y = store.y[rows].copy()
+        self.tokens = store.tokens[rows].copy()
+        self.goal_reached = store.goal_reached[rows].copy()
+        self.received = received
+        self.given = given
+        # The board only changes when a tile is recolored; frames share it otherwise
+        self.board = board
+
+
+class FrameRecorder:
+    """
+    Throttled frames of a model, for any number of readers.
+
+    Installs itself as the model's telemetry hook (forwarding to the one
+    already there) to add up every step's transfers before the market resets
+    them. frame() must be called between steps; it only copies the state when
+    1/fps seconds have passed since the last frame, or when forced.
+    """
+
+    def __init__(self, model, fps=20):
+        self.model = model
+        self.interval = 1.0 / fps
+        # Agents by their agents_infos key, as in game outcomes, telemetry and traces
+        self.ids = np.array([agent.agent_id for agent in model.agent_store.agents], dtype=np.int64)
+        self.telemetry, model.telemetry = model.telemetry, self
+        shape = (len(self.ids), len(COLORS))
+        self._received = np.zeros(shape, dtype=np.int64)
+        self._given = np.zeros(shape, dtype=np.int64)
+        self._board = self._board_version = None
+        self._published = float("-inf")
+        self._latest = None
+        self._changed = threading.Condition()
+
+    def record_step(self, model):
+        if self.telemetry is not None:
+            self.telemetry.record_step(model)
+        self._received += model.market.received
+        self._given += model.market.given
+
+    def frame(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._published < self.interval:
+            return
+        self._published = now
+        board = self.model.tile_colors
+        if board.version != self._board_version:
+            self._board, self._board_version = board.colors.copy(), board.version
+        index = self._latest.index + 1 if self._latest is not None else 0
+        frame = Frame(index, self.model, self._received, self._given, self._board)
+        shape = self._received.shape
+        self._received = np.zeros(shape, dtype=np.int64)
+        self._given = np.zeros(shape, dtype=np.int64)
+        with self._changed:
+            self._latest = frame
+            self._changed.notify_all()
+
+    def wait(self, after=-1, timeout=None):
+        """The latest frame once it is newer than index `after`, or None after timeout seconds"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._latest is not None and self._latest.index > after, timeout)
+            latest = self._latest
+        return latest if latest is not None and latest.index > after else None
+
+
+class ModelRunner(threading.Thread):
+    """Steps the model as fast as it goes (or every `delay` seconds), publishing throttled frames"""
+
+    def __init__(self, model, recorder, max_steps=None, delay=0.0):
+        super().__init__(daemon=True)
+        self.model = model
+        self.recorder = recorder
+        self.max_steps = max_steps
+        self.delay = delay
+        self.stopped = threading.Event()
+
+    def run(self):
+        model = self.model
+        model.running = True
+        self.recorder.frame(force=True)
+        steps = 0
+        while model.running and not self.stopped.is_set():
+            if self.max_steps is not None and steps >= self.max_steps:
+                model.running = False
+                break
+            model.step()
+            steps += 1
+            self.recorder.frame()
+            if self.delay:
+                self.stopped.wait(self.delay)
+        self.recorder.frame(force=True)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _agent_rows(ids, rows, *columns):
+    """[[id, column values...], ...] for the given rows"""
+    table = np.column_stack([ids[rows]] + [np.asarray(column)[rows].reshape(len(rows), -1) for column in columns])
+    return table.astype(np.int64).tolist()
+
+
+class ClientView:
+    """What one browser has been sent, to work out the next diff for its viewport"""
+
+    def __init__(self, ids, viewport):
+        self.ids = ids
+        self.x0, self.y0, self.x1, self.y1 = viewport
+        self.known = np.zeros(len(ids), dtype=bool)
+        self.x = np.zeros(len(ids), dtype=np.int64)
+        self.y = np.zeros(len(ids), dtype=np.int64)
+        self.tokens = np.zeros((len(ids), len(COLORS)), dtype=np.int64)
+        self.goal_reached = np.zeros(len(ids), dtype=bool)
+        self.board = None
+
+    def visible(self, frame):
+        return (frame.x >= self.x0) & (frame.x < self.x1) & (frame.y >= self.y0) & (frame.y < self.y1)
+
+    def tiles(self, board):
+        region = np.ascontiguousarray(board[self.x0:self.x1, self.y0:self.y1], dtype=np.uint8)
+        return {"x": self.x0, "y": self.y0, "width": region.shape[0], "height": region.shape[1],
+                "colors": base64.b64encode(region.tobytes()).decode("ascii")}
+
+    def diff(self, frame):
+        """Changes since the last frame sent, or None if there are none"""
+        visible = self.visible(frame)
+        gone = np.flatnonzero(self.known & ~visible)
+        new = visible & ~self.known
+        kept = visible & self.known
+        moved = kept & ((frame.x != self.x) | (frame.y != self.y))
+        restocked = kept & (frame.tokens != self.tokens).any(axis=1)
+        arrived = kept & (frame.goal_reached != self.goal_reached)
+        traded = visible & (frame.received.any(axis=1) | frame.given.any(axis=1))
+
+        changes = {}
+        if frame.board is not self.board:
+            changes["tiles"] = self.tiles(frame.board)
+            self.board = frame.board
+        if new.any():
+            changes["agents"] = _agent_rows(self.ids, np.flatnonzero(new), frame.x, frame.y,
+                                            frame.tokens, frame.goal_reached)
+        if len(gone):
+            changes["gone"] = self.ids[gone].tolist()
+        if moved.any():
+            changes["moved"] = _agent_rows(self.ids, np.flatnonzero(moved), frame.x, frame.y)
+        if restocked.any():
+            changes["tokens"] = _agent_rows(self.ids, np.flatnonzero(restocked), frame.tokens)
+        if arrived.any():
+            changes["goal"] = self.ids[arrived].tolist()
+        if traded.any():
+            changes["offers"] = _agent_rows(self.ids, np.flatnonzero(traded), frame.received, frame.given)
+
+        self.known = visible
+        self.x[visible] = frame.x[visible]
+        self.y[visible] = frame.y[visible]
+        self.tokens[visible] = frame.tokens[visible]
+        self.goal_reached[visible] = frame.goal_reached[visible]
+        if not changes and frame.running:
+            return None
+        changes.update(step=frame.step, running=frame.running)
+        return changes
+
+
+class VisualizationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recorder, keepalive=15.0):
+        super().__init__(address, VisualizationHandler)
+        self.recorder = recorder
+        self.keepalive = keepalive
+
+
+class VisualizationHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/":
+            self.send_page()
+        elif url.path == "/events":
+            self.stream(parse_qs(url.query))
+        else:
+            self.send_error(404)
+
+    def send_page(self):
+        body = PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def viewport(self, query, model):
+        def bound(name, default, limit):
+            try:
+                value = int(query[name][0])
+            except (KeyError, ValueError):
+                value = default
+            return min(max(value, 0), limit)
+
+        width, height = model.grid_width, model.grid_height
+        x0, y0 = bound("x0", 0, width), bound("y0", 0, height)
+        return x0, y0, max(bound("x1", width, width), x0), max(bound("y1", height, height), y0)
+
+    def send_event(self, name, payload):
+        data = json.dumps(payload, separators=(",", ":"))
+        self.wfile.write(f"event: {name}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def stream(self, query):
+        """Server-sent events: the viewport's state once, then diffs until the game ends"""
+        recorder = self.server.recorder
+        model = recorder.model
+        view = ClientView(recorder.ids, self.viewport(query, model))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            self.send_event("setup", {"width": model.grid_width, "height": model.grid_height,
+                                      "goal": list(model.goal_pos), "colors": COLORS})
+            index = -1
+            while True:
+                frame = recorder.wait(index, self.server.keepalive)
+                if frame is None:
+                    # Comment line, so proxies and the browser keep the connection open
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                index = frame.index
+                changes = view.diff(frame)
+                if changes is not None:
+                    self.send_event("diff", changes)
+                if not frame.running:
+                    self.send_event("end", {"step": frame.step})
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(model, host="127.0.0.1", port=8521, fps=20, max_steps=None, delay=0.0):
+    """Run the model in a background thread and serve its view until interrupted"""
+    recorder = FrameRecorder(model, fps)
+    runner = ModelRunner(model, recorder, max_steps, delay)
+    server = VisualizationServer((host, port), recorder)
+    runner.start()
+    print(f"serving on http://{host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+        server.server_close()
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Colored Trails</title>
+<style>
+  html, body { margin: 0; height: 100%; overflow: hidden; font: 13px sans-serif; }
+  canvas { display: block; cursor: grab; }
+  #status { position: absolute; top: 8px; left: 8px; padding: 4px 8px; background: rgba(255,255,255,.85); }
+</style>
+</head>
+<body>
+<canvas id="board"></canvas>
+<div id="status">connecting...</div>
+<script>
+const canvas = document.getElementById("board");
+const ctx = canvas.getContext("2d");
+const status = document.getElementById("status");
+// Tile size in pixels and the board coordinates of the top-left corner
+let game = null, tiles = null, tileSize = 24, originX = 0, originY = 0;
+let agents = new Map(), offers = new Map(), step = 0, running = true, selected = null;
+let source = null, dirty = true, reconnectTimer = null;
+
+function viewport() {
+  const x0 = Math.max(0, Math.floor(originX)), y0 = Math.max(0, Math.floor(originY));
+  const x1 = Math.min(game.width, Math.ceil(originX + canvas.width / tileSize));
+  const y1 = Math.min(game.height, Math.ceil(originY + canvas.height / tileSize));
+  return [x0, y0, Math.max(x0, x1), Math.max(y0, y1)];
+}
+
+function connect() {
+  if (source) source.close();
+  const view = game ? viewport() : [0, 0, 0, 0];
+  source = new EventSource(game ? `/events?x0=${view[0]}&y0=${view[1]}&x1=${view[2]}&y1=${view[3]}`
+                                : "/events?x1=0&y1=0");
+  agents = new Map();
+  offers = new Map();
+  source.addEventListener("setup", e => {
+    const first = game === null;
+    game = JSON.parse(e.data);
+    if (first) {
+      // Fit the whole board, then fetch the tiles of what is actually visible
+      tileSize = Math.max(1, Math.min(canvas.width / game.width, canvas.height / game.height));
+      connect();
+    }
+  });
+  source.addEventListener("diff", e => apply(JSON.parse(e.data)));
+  source.addEventListener("end", e => { running = false; source.close(); dirty = true; });
+}
+
+function apply(d) {
+  if (d.tiles) {
+    const raw = atob(d.tiles.colors), colors = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) colors[i] = raw.charCodeAt(i);
+    tiles = { ...d.tiles, colors };
+  }
+  for (const [id, x, y, ...rest] of d.agents || []) {
+    agents.set(id, { x, y, tokens: rest.slice(0, game.colors.length), goal: rest[game.colors.length] === 1 });
+  }
+  for (const id of d.gone || []) agents.delete(id);
+  for (const [id, x, y] of d.moved || []) Object.assign(agents.get(id), { x, y });
+  for (const [id, ...tokens] of d.tokens || []) agents.get(id).tokens = tokens;
+  for (const id of d.goal || []) agents.get(id).goal = true;
+  offers = new Map();
+  for (const [id, ...flows] of d.offers || []) offers.set(id, flows);
+  step = d.step;
+  running = d.running;
+  dirty = true;
+}
+
+function draw() {
+  requestAnimationFrame(draw);
+  if (!dirty || !game) return;
+  dirty = false;
+  ctx.fillStyle = "#fff";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  const [x0, y0, x1, y1] = viewport();
+  const px = x => (x - originX) * tileSize, py = y => (y - originY) * tileSize;
+  if (tiles) {
+    // Only the tiles on screen, even when the loaded region is larger
+    for (let x = Math.max(x0, tiles.x); x < Math.min(x1, tiles.x + tiles.width); x++) {
+      for (let y = Math.max(y0, tiles.y); y < Math.min(y1, tiles.y + tiles.height); y++) {
+        ctx.fillStyle = game.colors[tiles.colors[(x - tiles.x) * tiles.height + (y - tiles.y)]];
+        ctx.fillRect(px(x), py(y), tileSize, tileSize);
+      }
+    }
+  }
+  if (tileSize >= 8) {
+    ctx.strokeStyle = "rgba(0,0,0,.25)";
+    ctx.beginPath();
+    for (let x = x0; x <= x1; x++) { ctx.moveTo(px(x), py(y0)); ctx.lineTo(px(x), py(y1)); }
+    for (let y = y0; y <= y1; y++) { ctx.moveTo(px(x0), py(y)); ctx.lineTo(px(x1), py(y)); }
+    ctx.stroke();
+  }
+  ctx.strokeStyle = "red";
+  ctx.lineWidth = Math.max(1, tileSize / 8);
+  ctx.strokeRect(px(game.goal[0]), py(game.goal[1]), tileSize, tileSize);
+  ctx.lineWidth = 1;
+  const radius = Math.max(1, tileSize * 0.3);
+  for (const [id, agent] of agents) {
+    const cx = px(agent.x + 0.5), cy = py(agent.y + 0.5);
+    ctx.fillStyle = agent.goal ? "red" : id === selected ? "#06f" : "#000";
+    ctx.beginPath();
+    ctx.arc(cx, cy, radius, 0, 2 * Math.PI);
+    ctx.fill();
+    if (offers.has(id)) {
+      ctx.strokeStyle = "#0c0";
+      ctx.beginPath();
+      ctx.arc(cx, cy, radius * 1.5, 0, 2 * Math.PI);
+      ctx.stroke();
+    }
+  }
+  let text = `step ${step}${running ? "" : " (ended)"} - ${agents.size} agents in view`;
+  const agent = agents.get(selected);
+  if (agent) {
+    const held = game.colors.map((color, c) => `${color} ${agent.tokens[c]}`).join(", ");
+    text += ` - agent ${selected} at (${agent.x}, ${agent.y}): ${held}`;
+    const flows = offers.get(selected);
+    if (flows) {
+      const n = game.colors.length;
+      text += ` - received [${flows.slice(0, n)}], gave [${flows.slice(n)}]`;
+    }
+  }
+  status.textContent = text;
+}
+
+function viewChanged() {
+  dirty = true;
+  // Reconnect for the new viewport once panning or zooming pauses
+  clearTimeout(reconnectTimer);
+  reconnectTimer = setTimeout(connect, 150);
+}
+
+function resize() {
+  canvas.width = window.innerWidth;
+  canvas.height = window.innerHeight;
+  if (game) viewChanged();
+}
+
+let drag = null;
+canvas.addEventListener("mousedown", e => { drag = { x: e.clientX, y: e.clientY, moved: false }; });
+window.addEventListener("mouseup", e => {
+  if (drag && !drag.moved && game) {
+    const x = Math.floor(originX + e.clientX / tileSize), y = Math.floor(originY + e.clientY / tileSize);
+    selected = null;
+    for (const [id, agent] of agents) if (agent.x === x && agent.y === y) selected = id;
+    dirty = true;
+  }
+  drag = null;
+});
+window.addEventListener("mousemove", e => {
+  if (!drag) return;
+  originX -= (e.clientX - drag.x) / tileSize;
+  originY -= (e.clientY - drag.y) / tileSize;
+  drag = { x: e.clientX, y: e.clientY, moved: true };
+  viewChanged();
+});
+canvas.addEventListener("wheel", e => {
+  e.preventDefault();
+  // Zoom around the pointer
+  const scale = e.deltaY < 0 ? 1.25 : 0.8;
+  const bx = originX + e.clientX / tileSize, by = originY + e.clientY / tileSize;
+  tileSize = Math.min(64, Math.max(0.5, tileSize * scale));
+  originX = bx - e.clientX / tileSize;
+  originY = by - e.clientY / tileSize;
+  viewChanged();
+}, { passive: false });
+window.addEventListener("resize", resize);
+resize();
+connect();
+draw();
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a live browser view of a random game")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=5)
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--agent-class", choices=sorted(AGENT_CLASSES), default="player")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="most tokens of each color per agent (default: enough to cross the board)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds between steps, to watch small games")
+    parser.add_argument("--fps", type=float, default=20, help="most frames sent to the browser per second")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8521)
+    args = parser.parse_args()
+
+    max_tokens = args.max_tokens if args.max_tokens is not None else max(1, (args.width + args.height) // len(COLORS))
+    scenario = Scenario(args.width, args.height, args.agents, agent_mix={args.agent_class: 1},
+                        token_range=(0, max_tokens), seed=args.seed)
+    serve(ColoredTrailsModel(seed=args.seed, scenario=scenario), args.host, args.port, args.fps,
+          args.max_steps, args.delay)
@@ -0,0 +1,11 @@
+from model.batch_engine import PlayerBatch, validate_against_model
+
+
+def test_batch_matches_the_model():
+    assert validate_against_model(list(range(150))) == []
+
+
+def test_outcomes_vary_across_seeds():
+    # Guards the comparison above against every game ending the same way
+    outcomes = PlayerBatch.from_seeds(list(range(150))).run(100).outcomes()
+    assert len({str(outcome) for outcome in outcomes}) > 1
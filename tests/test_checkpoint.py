@@ -0,0 +1,37 @@
+import pytest
+from model.checkpoint import load_checkpoint, save_checkpoint
+from model.game_model import ColoredTrailsModel
+from model.parallel import ParallelPlanning
+from model.scenario import Scenario
+
+
+def state(model):
+    store = model.agent_store
+    return (model.schedule.steps, model.running, model.tokens_spent, model.market.trades_made,
+            [(agent.agent_id, agent.pos, dict(agent.tokens), agent.goal_reached) for agent in store.agents])
+
+
+@pytest.mark.parametrize("planning", [None, "threads"])
+def test_restored_game_replays_the_original(tmp_path, planning):
+    for seed in range(4):
+        scenario = Scenario(10, 10, n_agents=6, agent_mix={"player": 1, "strategic": 1, "collaborative": 1},
+                            seed=seed)
+        workers = ParallelPlanning(workers=2, processes=False) if planning else None
+        model = ColoredTrailsModel(scenario=scenario, early_stop=False, planning=workers)
+        model.running = True
+        for _ in range(5):
+            model.step()
+        path = tmp_path / f"game_{seed}.ckpt"
+        save_checkpoint(model, path)
+
+        restored = load_checkpoint(path)
+        assert restored.early_stop is False
+        assert (restored.planning is None) == (planning is None)
+        assert state(restored) == state(model)
+        for _ in range(20):
+            model.step()
+            restored.step()
+            assert state(restored) == state(model)
+        for game in (model, restored):
+            if game.planning is not None:
+                game.planning.close()
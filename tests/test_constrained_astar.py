@@ -0,0 +1,43 @@
+import random
+import numpy as np
+import pytest
+from constants import COLORS
+from model.parallel import PlanningBoard
+from pathfinding.constrained_astar import constrained_astar
+
+
+def simple_paths(board, pos, path):
+    if pos == board.goal_pos:
+        yield list(path)
+        return
+    for neighbor in board.board_graph.neighbors(pos):
+        if neighbor not in path:
+            path.append(neighbor)
+            yield from simple_paths(board, neighbor, path)
+            path.pop()
+
+
+def deficit(board, path, tokens):
+    spent = {}
+    for pos in path[1:]:
+        spent[board.tile_colors[pos]] = spent.get(board.tile_colors[pos], 0) + 1
+    return {color: count - tokens.get(color, 0) for color, count in spent.items() if count > tokens.get(color, 0)}
+
+
+@pytest.mark.parametrize("use_requirements", [False, True])
+def test_matches_brute_force(use_requirements):
+    rng = random.Random(3)
+    for _ in range(60):
+        width, height = rng.randint(1, 4), rng.randint(2, 4)
+        tiles = np.array([[rng.randrange(len(COLORS)) for _ in range(height)] for _ in range(width)], dtype=np.uint8)
+        board = PlanningBoard(width, height, tiles, (width - 1, height - 1))
+        tokens = {color: rng.randrange(3) for color in COLORS}
+        requirements = board.color_requirement_field(board.goal_pos) if use_requirements else None
+
+        path, missing = constrained_astar((0, 0), board.goal_pos, tokens, board.board_graph,
+                                          board.tile_colors, requirements, max_labels=None)
+        # Fewest missing tokens first, then fewest steps
+        best = min((sum(deficit(board, p, tokens).values()), len(p)) for p in simple_paths(board, (0, 0), [(0, 0)]))
+        assert path[0] == (0, 0) and path[-1] == board.goal_pos
+        assert missing == deficit(board, path, tokens)
+        assert (sum(missing.values()), len(path)) == best
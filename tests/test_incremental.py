@@ -0,0 +1,57 @@
+import heapq
+import random
+import numpy as np
+import pytest
+from constants import COLORS
+from model.parallel import PlanningBoard
+from pathfinding.incremental import IncrementalPlanner
+
+
+def random_board(rng, colors=4):
+    width, height = rng.randint(2, 9), rng.randint(2, 9)
+    tiles = np.array([[rng.randrange(colors) for _ in range(height)] for _ in range(width)], dtype=np.uint8)
+    goal_pos = (rng.randrange(width), rng.randrange(height))
+    return PlanningBoard(width, height, tiles, goal_pos)
+
+
+def dijkstra_cost(board, start_pos, weights):
+    """Cheapest cost from start_pos to the goal, paying the weight of every tile entered"""
+    best = {start_pos: 0.0}
+    heap = [(0.0, start_pos)]
+    while heap:
+        cost, pos = heapq.heappop(heap)
+        if pos == board.goal_pos:
+            return cost
+        if cost > best[pos]:
+            continue
+        for neighbor in board.board_graph.neighbors(pos):
+            new_cost = cost + weights[board.tile_colors[neighbor]]
+            if new_cost < best.get(neighbor, float("inf")):
+                best[neighbor] = new_cost
+                heapq.heappush(heap, (new_cost, neighbor))
+    raise AssertionError("goal unreachable")
+
+
+def path_cost(board, path, weights):
+    return sum(weights[board.tile_colors[pos]] for pos in path[1:])
+
+
+@pytest.mark.parametrize("repair_limit", [0, 0.1, 1.0])
+def test_repairs_match_dijkstra(repair_limit):
+    rng = random.Random(5)
+    for _ in range(40):
+        board = random_board(rng)
+        weights = {color: 1 + rng.choice([0, 1, 2.5, 3]) for color in COLORS}
+        planner = IncrementalPlanner(board.board_graph, board.tile_colors, board.goal_pos, weights,
+                                     board.board_index(), repair_limit)
+        pos = (rng.randrange(board.board_graph.width), rng.randrange(board.board_graph.height))
+        for _ in range(10):
+            # Move along the last path and change some weights between plans
+            if rng.random() < 0.5:
+                weights = dict(weights, **{rng.choice(COLORS): 1 + rng.choice([0, 0.3, 1, 2.5, 3])})
+            path = planner.plan(pos, weights)
+            assert path[0] == pos and path[-1] == board.goal_pos
+            assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:]))
+            assert path_cost(board, path, weights) == pytest.approx(dijkstra_cost(board, pos, weights))
+            if len(path) > 1:
+                pos = path[min(len(path) - 1, rng.randint(1, 2))]
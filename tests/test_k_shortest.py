@@ -0,0 +1,35 @@
+import random
+import numpy as np
+import pytest
+from constants import COLORS
+from model.parallel import PlanningBoard
+from pathfinding.k_shortest import shortest_simple_paths
+
+
+def simple_paths(board, pos, path):
+    if pos == board.goal_pos:
+        yield tuple(path)
+        return
+    for neighbor in board.board_graph.neighbors(pos):
+        if neighbor not in path:
+            path.append(neighbor)
+            yield from simple_paths(board, neighbor, path)
+            path.pop()
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_yields_every_simple_path_by_cost(weighted):
+    rng = random.Random(7)
+    for _ in range(30):
+        width, height = rng.randint(1, 3), rng.randint(2, 4)
+        tiles = np.array([[rng.randrange(len(COLORS)) for _ in range(height)] for _ in range(width)], dtype=np.uint8)
+        board = PlanningBoard(width, height, tiles, (width - 1, height - 1))
+        weights = {color: rng.choice([1, 2, 3.5]) if weighted else 1 for color in COLORS}
+        node_cost = lambda pos: weights[board.tile_colors[pos]]
+
+        paths = [tuple(path) for path in shortest_simple_paths(board.board_graph, (0, 0), board.goal_pos,
+                                                               node_cost, min(weights.values()))]
+        expected = list(simple_paths(board, (0, 0), [(0, 0)]))
+        assert sorted(paths) == sorted(expected)
+        costs = [sum(map(node_cost, path[1:])) for path in paths]
+        assert costs == sorted(costs)
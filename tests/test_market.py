@@ -0,0 +1,34 @@
+import random
+import numpy as np
+from model.market import match_color
+
+
+def serve_in_order(need, excess):
+    """Transfers of serving receivers in order from givers in order, one token count at a time"""
+    need, excess = list(need), list(excess)
+    transfers = {}
+    giver = receiver = 0
+    while giver < len(excess) and receiver < len(need):
+        if excess[giver] == 0:
+            giver += 1
+        elif need[receiver] == 0:
+            receiver += 1
+        else:
+            amount = min(excess[giver], need[receiver])
+            transfers[giver, receiver] = transfers.get((giver, receiver), 0) + amount
+            excess[giver] -= amount
+            need[receiver] -= amount
+    return transfers
+
+
+def test_match_color_matches_serial_loop():
+    rng = random.Random(2)
+    for _ in range(500):
+        need = [rng.choice([0, 0, 1, 2, 5]) for _ in range(rng.randint(0, 6))]
+        excess = [rng.choice([0, 0, 1, 3, 4]) for _ in range(rng.randint(0, 6))]
+        givers, receivers, amounts = match_color(np.array(need, dtype=np.int64), np.array(excess, dtype=np.int64))
+        assert (amounts > 0).all()
+        transfers = {}
+        for g, r, amount in zip(givers.tolist(), receivers.tolist(), amounts.tolist()):
+            transfers[g, r] = transfers.get((g, r), 0) + amount
+        assert transfers == serve_in_order(need, excess)
@@ -0,0 +1,63 @@
+import itertools
+import random
+import numpy as np
+from constants import COLORS
+from model.board import BoardGraph
+from model import oracle
+
+
+def path_vectors(colors, start, goal_pos):
+    """Token vectors of every simple path from start to the goal, and the steps each takes at least"""
+    graph = BoardGraph(*colors.shape)
+    found = {}
+
+    def walk(pos, path, vector):
+        if pos == goal_pos:
+            key = tuple(vector)
+            found[key] = min(found.get(key, len(path) - 1), len(path) - 1)
+            return
+        for neighbor in graph.neighbors(pos):
+            if neighbor not in path:
+                vector[colors[neighbor]] += 1
+                path.append(neighbor)
+                walk(neighbor, path, vector)
+                path.pop()
+                vector[colors[neighbor]] -= 1
+
+    walk(start, [start], [0] * len(COLORS))
+    return found
+
+
+def exhaustive(colors, starts, tokens, goal_pos):
+    """(reached, spent, first_arrival) of the best allocation, trying every choice of path for every agent"""
+    pool = np.asarray(tokens).sum(axis=0)
+    options = [[None] + [np.array(v) for v in path_vectors(colors, start, goal_pos)] for start in starts]
+    best = (0, 0)
+    for choice in itertools.product(*options):
+        chosen = [vector for vector in choice if vector is not None]
+        spent = np.sum(chosen, axis=0) if chosen else np.zeros(len(COLORS), dtype=int)
+        if (spent <= pool).all():
+            best = max(best, (len(chosen), -int(spent.sum())))
+    arrivals = [steps for start in starts for vector, steps in path_vectors(colors, start, goal_pos).items()
+                if (np.array(vector) <= pool).all()]
+    return best[0], -best[1], min(arrivals) if arrivals else None
+
+
+def test_matches_exhaustive_search():
+    rng = random.Random(11)
+    for _ in range(60):
+        width, height = rng.randint(2, 3), rng.randint(2, 3)
+        colors = np.array([[rng.randrange(3) for _ in range(height)] for _ in range(width)], dtype=np.int64)
+        goal_pos = (rng.randrange(width), rng.randrange(height))
+        agents = rng.randint(1, 3)
+        starts = [(rng.randrange(width), rng.randrange(height)) for _ in range(agents)]
+        tokens = [[rng.randrange(3) for _ in COLORS] for _ in range(agents)]
+
+        optimum = oracle.solve(colors, starts, tokens, goal_pos)
+        assert (len(optimum.reached), optimum.spent, optimum.first_arrival) == exhaustive(colors, starts, tokens,
+                                                                                          goal_pos)
+        assert (optimum.allocation.sum(axis=0) <= np.asarray(tokens).sum(axis=0)).all()
+        for agent, path in optimum.paths.items():
+            assert path[0] == starts[agent] and path[-1] == goal_pos
+            spent = np.bincount([colors[pos] for pos in path[1:]], minlength=len(COLORS))
+            assert (spent == optimum.allocation[agent]).all()
@@ -1,17 +1,50 @@
-import networkx as nx
-from collections import defaultdict
+import numpy as np
+from constants import COLORS, COLOR_INDEX
+from pathfinding.constrained_astar import constrained_astar
+from model.agent_store import TokenView
 
 def find_best_path(start_pos, goal_pos, model):
-    # Find the shortest path
-    G = nx.grid_2d_graph(model.grid_width, model.grid_height)
-    return nx.shortest_path(G, source=start_pos, target=goal_pos)
+    # Find the shortest path by walking the model's cached goal field
+    if model.metrics.enabled:
+        model.metrics.count("path_searches")
+    return model.board_graph.shortest_path(start_pos, goal_pos)
 
 
 def compute_token_needs(path, current_tokens, game_model):
-    needed = defaultdict(int)
-    for pos in path:
-        color = game_model.tile_colors[pos]
-        needed[color] += 1
-    for color in current_tokens:
-        needed[color] = max(0, needed[color] - current_tokens.get(color, 0))
-    return dict(needed)
+    # Color histogram of the path minus what we already hold
+    return needs_from_counts(game_model.tile_colors.histogram(path), current_tokens)
+
+
+def needs_from_counts(counts, current_tokens):
+    return to_dict(np.maximum(counts - to_vector(current_tokens), 0))
+
+
+def to_vector(tokens):
+    """Dense token vector (indexed like COLORS) from a color -> amount dict"""
+    if isinstance(tokens, TokenView):
+        return tokens.vector()
+    vector = np.zeros(len(COLORS), dtype=np.int64)
+    for color, amount in tokens.items():
+        vector[COLOR_INDEX[color]] = amount
+    return vector
+
+
+def inventory_key(tokens):
+    """Hashable token inventory, indexed like COLORS"""
+    return tuple(to_vector(tokens).tolist())
+
+
+def to_dict(vector):
+    return {COLORS[i]: int(amount) for i, amount in enumerate(vector) if amount}
+
+
+def find_affordable_path(start_pos, goal_pos, current_tokens, model):
+    # Shortest path the tokens can pay for, or the one with the smallest deficit
+    def search():
+        if model.metrics.enabled:
+            model.metrics.count("path_searches")
+        return constrained_astar(start_pos, goal_pos, current_tokens, model.board_graph, model.tile_colors,
+                                 requirements=model.color_requirement_field(goal_pos))
+
+    key = ("affordable", start_pos, inventory_key(current_tokens), goal_pos, model.tile_colors.version)
+    return model.path_cache.get_or_compute(key, search)